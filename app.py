@@ -7,6 +7,9 @@ from dotenv import load_dotenv
 from extensions import db
 from models import init_db
 from flask_migrate import Migrate
+from logs import configure_logging
+from metrics import init_metrics
+import logging
 import os
 
 # ------------------------------------------------------------------
@@ -74,6 +77,7 @@ required_env_vars = [
     "TWILIO_WHATSAPP_FROM",
     "PAYSTACK_SECRET_KEY",
     "PAYSTACK_BASE_URL",
+    "BACKEND_URL",  # public base URL; emails built by the background worker link images through it
 ]
 for var in required_env_vars:
     if not os.getenv(var):
@@ -84,6 +88,9 @@ for var in required_env_vars:
 # ------------------------------------------------------------------
 FROM_EMAIL = get_config("FROM_EMAIL", "no-reply@ohamsmovies.com.ng")
 TWILIO_WHATSAPP_FROM = get_config("TWILIO_WHATSAPP_FROM")   # guaranteed to exist
+app.config["FROM_EMAIL"] = FROM_EMAIL
+app.config["TWILIO_WHATSAPP_FROM"] = TWILIO_WHATSAPP_FROM
+app.config["TWILIO_CLIENT"] = get_twilio_client()
 
 # ------------------------------------------------------------------
 # Health & root endpoints
@@ -108,24 +115,19 @@ def index():
 
 
 # ------------------------------------------------------------------
-# Debug logging (optional)
+# Structured request logging (JSON lines, queued off the request thread)
 # ------------------------------------------------------------------
-@app.before_request
-def log_request():
-    headers = {
-        k: v for k, v in request.headers.items() if k not in ["Authorization"]
-    }
-    print(f"DEBUG: {request.method} request to {request.path}")
-    print(f"DEBUG: Origin: {request.headers.get('Origin')}")
-    print(f"DEBUG: Headers: {headers}")
+configure_logging(app)
+logger = logging.getLogger("app")
 
 
 # ------------------------------------------------------------------
-# DB, JWT, Migrations
+# DB, JWT, Migrations, Metrics
 # ------------------------------------------------------------------
 db.init_app(app)
 jwt = JWTManager(app)
 migrate = Migrate(app, db)
+init_metrics(app, db)
 
 
 def init_app(app):
@@ -137,24 +139,36 @@ def init_app(app):
 init_app(app)
 
 
+@app.cli.command("backfill-fliers")
+def backfill_fliers():
+    """Move inline fliers into the image store and render missing variants.
+
+    Run once after `flask db upgrade`; kept out of startup so the app can boot
+    before the migration that adds movies.flier_hash has been applied.
+    """
+    from images import backfill_flier_store
+
+    backfill_flier_store()
+
+
 # ------------------------------------------------------------------
 # JWT error handlers
 # ------------------------------------------------------------------
 @jwt.invalid_token_loader
 def invalid_token_callback(error):
-    print(f"DEBUG: JWT invalid token error: {error}")
+    logger.info("JWT invalid token error: %s", error)
     return jsonify({"message": "Invalid token", "error": str(error)}), 401
 
 
 @jwt.unauthorized_loader
 def unauthorized_callback(error):
-    print(f"DEBUG: JWT unauthorized error: {error}")
+    logger.info("JWT unauthorized error: %s", error)
     return jsonify({"message": "Missing or invalid token", "error": str(error)}), 401
 
 
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
-    print(f"DEBUG: JWT expired token error: {jwt_payload}")
+    logger.info("JWT expired token for identity %s", jwt_payload.get("sub"))
     return jsonify({"message": "Token expired", "error": "Token has expired"}), 401
 
 
@@ -164,7 +178,14 @@ def expired_token_callback(jwt_header, jwt_payload):
 from routes import api_blueprint
 
 app.register_blueprint(api_blueprint, url_prefix="/api")
-print("DEBUG: Registered api_blueprint with /api prefix")
+
+
+# ------------------------------------------------------------------
+# Background worker (notification outbox)
+# ------------------------------------------------------------------
+from worker import init_worker
+
+init_worker(app)
 
 
 # ------------------------------------------------------------------
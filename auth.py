@@ -0,0 +1,51 @@
+from flask import jsonify
+from flask_jwt_extended import verify_jwt_in_request, get_jwt, get_jwt_identity
+from extensions import db
+from models import User
+from functools import wraps
+from threading import Lock
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long a worker trusts the admin claim before re-checking the user row;
+# a demoted or deleted admin loses access within this window.
+ROLE_TTL = float(os.getenv('ADMIN_ROLE_TTL_SECONDS', '60'))
+
+_lock = Lock()
+_roles = {}  # user id -> (is_admin, checked_at)
+
+
+def _is_still_admin(user_id):
+    now = time.monotonic()
+    cached = _roles.get(user_id)
+    if cached and now - cached[1] < ROLE_TTL:
+        return cached[0]
+    is_admin = bool(db.session.query(User.is_admin).filter_by(id=user_id).scalar())
+    with _lock:
+        _roles[user_id] = (is_admin, now)
+    return is_admin
+
+
+def forget_user(user_id):
+    """Drop a cached role so the next request re-reads it, e.g. after deleting or demoting a user."""
+    with _lock:
+        _roles.pop(int(user_id), None)
+
+
+def admin_required(fn):
+    """Like jwt_required(), but also rejects tokens without a current admin role.
+
+    The is_admin claim set at login is trusted first, so non-admins never cost a
+    query; admins are confirmed against the DB at most once per ROLE_TTL.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        if not get_jwt().get('is_admin') or not _is_still_admin(int(get_jwt_identity())):
+            logger.warning('Admin access denied for identity %s', get_jwt_identity())
+            return jsonify({'message': 'Admin access required'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,238 @@
+from flask import current_app
+from extensions import db
+from models import BulkJob, BulkJobRecipient
+from notifications import get_provider, deliver, EMAIL_BATCH_LIMIT
+from messages import email_substitutions
+from sqlalchemy import or_, and_, case
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+import random
+import time
+import uuid
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv('BULK_MAX_WORKERS', '8'))
+RECIPIENT_MAX_ATTEMPTS = int(os.getenv('BULK_MAX_ATTEMPTS', '3'))
+# A running job that has made no progress for this long is assumed orphaned and re-claimed.
+JOB_LEASE = timedelta(minutes=10)
+# Recipients per SendGrid request for batched email jobs.
+EMAIL_BATCH_SIZE = min(int(os.getenv('SENDGRID_BATCH_SIZE', str(EMAIL_BATCH_LIMIT))), EMAIL_BATCH_LIMIT)
+
+
+class RateLimiter:
+    """Token bucket shared by every dispatch thread sending through one provider."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_limiters = {
+    'email': RateLimiter(float(os.getenv('SENDGRID_RATE_PER_SECOND', '20'))),
+    'whatsapp': RateLimiter(float(os.getenv('TWILIO_RATE_PER_SECOND', '10'))),
+}
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='bulk-send')
+
+
+def batch_email_message(recipient, ticket_token=None):
+    """A recipient of a batched email job; the subject and body come from the job."""
+    return {'channel': 'email', 'recipient': recipient, 'ticket_token': ticket_token}
+
+
+def whatsapp_message(phone, body, flier=None, ticket_token=None):
+    return {'channel': 'whatsapp', 'recipient': phone, 'body': body,
+            'media_flier_hash': flier.sha256 if flier else None, 'ticket_token': ticket_token}
+
+
+def submit_job(kind, messages, movie_id=None, created_by=None, email_subject=None, email_template=None):
+    """Record a campaign and its recipients on the session; it runs once the caller commits.
+
+    With email_subject and email_template, recipients from batch_email_message
+    are sent EMAIL_BATCH_SIZE per SendGrid request, filling in the template's
+    substitution tags per recipient.
+    """
+    job = BulkJob(id=uuid.uuid4().hex, kind=kind, movie_id=movie_id, created_by=created_by,
+                  email_subject=email_subject, email_template=email_template,
+                  total=len(messages), status='queued' if messages else 'completed')
+    db.session.add(job)
+    db.session.add_all([BulkJobRecipient(job_id=job.id, **message) for message in messages])
+    return job
+
+
+def dispatch_bulk_jobs(limit=5):
+    """Claim queued or orphaned jobs and fan their pending recipients out over the pool."""
+    now = datetime.utcnow()
+    jobs = BulkJob.query \
+        .filter(or_(BulkJob.status == 'queued',
+                    and_(BulkJob.status == 'running', BulkJob.claimed_at < now - JOB_LEASE))) \
+        .order_by(BulkJob.created_at) \
+        .limit(limit) \
+        .with_for_update(skip_locked=True) \
+        .all()
+    job_ids = [job.id for job in jobs]
+    for job in jobs:
+        job.status = 'running'
+        job.claimed_at = now
+    if job_ids:
+        # Sends interrupted by a dead process are retried.
+        BulkJobRecipient.query \
+            .filter(BulkJobRecipient.job_id.in_(job_ids), BulkJobRecipient.status == 'sending') \
+            .update({'status': 'pending'}, synchronize_session=False)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    batched = {job.id for job in jobs if job.email_template}
+    for job_id in job_ids:
+        pending = db.session.query(BulkJobRecipient.id, BulkJobRecipient.channel) \
+            .filter_by(job_id=job_id, status='pending').order_by(BulkJobRecipient.id).all()
+        logger.info('Dispatching bulk job %s to %s recipient(s)', job_id, len(pending))
+        emails = [rid for rid, channel in pending if channel == 'email' and job_id in batched]
+        for start in range(0, len(emails), EMAIL_BATCH_SIZE):
+            _executor.submit(_run_email_batch, app, job_id, emails[start:start + EMAIL_BATCH_SIZE])
+        for recipient_id, channel in pending:
+            if not (channel == 'email' and job_id in batched):
+                _executor.submit(_run_recipient, app, recipient_id)
+        _finish_if_done(job_id)
+    return len(job_ids)
+
+
+def _run_recipient(app, recipient_id):
+    with app.app_context():
+        try:
+            claimed = BulkJobRecipient.query \
+                .filter_by(id=recipient_id, status='pending') \
+                .update({'status': 'sending', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                return
+            item = db.session.get(BulkJobRecipient, recipient_id)
+            provider = get_provider()
+            limiter = _limiters[item.channel]
+            delivered = False
+            while not delivered and item.attempts < RECIPIENT_MAX_ATTEMPTS:
+                limiter.acquire()
+                item.attempts += 1
+                try:
+                    item.provider_id = deliver(item, provider)
+                    item.last_error = None
+                    delivered = True
+                except Exception as e:
+                    item.last_error = str(e)[:1000]
+                    logger.warning('Bulk job %s %s to %s attempt %s failed: %s', item.job_id, item.channel, item.recipient, item.attempts, e)
+                    if item.attempts < RECIPIENT_MAX_ATTEMPTS:
+                        time.sleep(2 ** item.attempts * random.uniform(0.5, 1.0))
+
+            now = datetime.utcnow()
+            item.status = 'sent' if delivered else 'failed'
+            item.updated_at = now
+            counter = BulkJob.sent if delivered else BulkJob.failed
+            BulkJob.query.filter_by(id=item.job_id) \
+                .update({counter: counter + 1, BulkJob.claimed_at: now}, synchronize_session=False)
+            db.session.commit()
+            _finish_if_done(item.job_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Bulk recipient %s crashed: %s', recipient_id, e)
+        finally:
+            db.session.remove()
+
+
+def _run_email_batch(app, job_id, recipient_ids):
+    with app.app_context():
+        try:
+            BulkJobRecipient.query \
+                .filter(BulkJobRecipient.id.in_(recipient_ids), BulkJobRecipient.status == 'pending') \
+                .update({'status': 'sending', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            items = BulkJobRecipient.query \
+                .filter(BulkJobRecipient.id.in_(recipient_ids), BulkJobRecipient.status == 'sending').all()
+            if not items:
+                return
+            job = db.session.get(BulkJob, job_id)
+            recipients = [(item.recipient, email_substitutions(item.recipient, item.ticket_token)) for item in items]
+            provider = get_provider()
+            provider_id, error, attempts = None, None, 0
+            while provider_id is None and attempts < RECIPIENT_MAX_ATTEMPTS:
+                _limiters['email'].acquire()
+                attempts += 1
+                try:
+                    provider_id = provider.send_email_batch(job.email_subject, job.email_template, recipients)
+                    error = None
+                except Exception as e:
+                    error = str(e)[:1000]
+                    logger.warning('Bulk job %s email batch of %s attempt %s failed: %s', job_id, len(items), attempts, e)
+                    if attempts < RECIPIENT_MAX_ATTEMPTS:
+                        time.sleep(2 ** attempts * random.uniform(0.5, 1.0))
+
+            now = datetime.utcnow()
+            delivered = provider_id is not None
+            for item in items:
+                item.attempts += attempts
+                item.status = 'sent' if delivered else 'failed'
+                item.provider_id = provider_id
+                item.last_error = error
+                item.updated_at = now
+            counter = BulkJob.sent if delivered else BulkJob.failed
+            BulkJob.query.filter_by(id=job_id) \
+                .update({counter: counter + len(items), BulkJob.claimed_at: now}, synchronize_session=False)
+            db.session.commit()
+            logger.info('Bulk job %s email batch of %s %s', job_id, len(items), 'sent' if delivered else 'failed')
+            _finish_if_done(job_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Bulk job %s email batch crashed: %s', job_id, e)
+        finally:
+            db.session.remove()
+
+
+def _finish_if_done(job_id):
+    BulkJob.query \
+        .filter(BulkJob.id == job_id, BulkJob.status == 'running', BulkJob.sent + BulkJob.failed >= BulkJob.total) \
+        .update({'status': case((BulkJob.failed > 0, 'completed_with_errors'), else_='completed'),
+                 'finished_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+
+
+def job_to_dict(job, include_recipients=False):
+    data = {
+        'job_id': job.id,
+        'kind': job.kind,
+        'movie_id': job.movie_id,
+        'status': job.status,
+        'total': job.total,
+        'sent': job.sent,
+        'failed': job.failed,
+        'pending': job.total - job.sent - job.failed,
+        'created_at': str(job.created_at),
+        'finished_at': str(job.finished_at) if job.finished_at else None
+    }
+    if include_recipients:
+        recipients = BulkJobRecipient.query.filter_by(job_id=job.id).order_by(BulkJobRecipient.id).all()
+        data['recipients'] = [{
+            'recipient': r.recipient,
+            'channel': r.channel,
+            'status': r.status,
+            'attempts': r.attempts,
+            'error': r.last_error,
+            'ticket_token': r.ticket_token
+        } for r in recipients]
+    return data
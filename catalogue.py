@@ -0,0 +1,115 @@
+from flask import current_app
+from settings import get_setting, set_setting
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import secrets
+import os
+
+# Stamp rewritten whenever anything shown in the public catalogue changes.
+VERSION_KEY = 'catalogue_version'
+# Bump when the serialized shape changes, so a shared cache never serves the old format.
+FORMAT_VERSION = 1
+
+
+class MemoryBackend:
+    """Per-process LRU of serialized responses."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class FileBackend:
+    """Responses stored as files in a directory all workers on the host can read.
+
+    Local stand-in for a shared store such as Redis: same get/set interface,
+    and entries are written atomically so readers never see half a body.
+    Every version bump changes the keys, so each write evicts the least
+    recently used files beyond max_entries.
+    """
+
+    def __init__(self, directory, max_entries=32):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return body
+
+    def set(self, key, body):
+        path = self._path(key)
+        tmp = f'{path}.{secrets.token_hex(4)}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+        self._evict(keep=path)
+
+    def _evict(self, keep):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.tmp') or entry.path == keep:
+                continue
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry.path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_entries + 1, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another worker evicted it first.
+                pass
+
+
+def get_cache():
+    """Return the app's response cache, chosen by RESPONSE_CACHE (memory or file)."""
+    cache = current_app.extensions.get('response_cache')
+    if cache is None:
+        max_entries = int(os.getenv('RESPONSE_CACHE_ENTRIES', '32'))
+        if os.getenv('RESPONSE_CACHE') == 'file':
+            cache = FileBackend(os.getenv('RESPONSE_CACHE_DIR', '/tmp/ohams-response-cache'), max_entries)
+        else:
+            cache = MemoryBackend(max_entries)
+        current_app.extensions['response_cache'] = cache
+    return cache
+
+
+def catalogue_etag(host_url):
+    """ETag for the catalogue as served on host_url (flier links are absolute)."""
+    key = f'{FORMAT_VERSION}:{get_setting(VERSION_KEY)}:{host_url}'
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def bump_catalogue_version():
+    """Invalidate cached catalogue responses once the caller commits."""
+    set_setting(VERSION_KEY, secrets.token_hex(8))
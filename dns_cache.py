@@ -0,0 +1,164 @@
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError, NameResolutionError
+from urllib3.util import connection
+from threading import Lock, Thread
+import dns.exception
+import dns.resolver
+import ipaddress
+import itertools
+import logging
+import socket
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+MIN_TTL = float(os.getenv('DNS_CACHE_MIN_TTL', '30'))
+MAX_TTL = float(os.getenv('DNS_CACHE_MAX_TTL', '3600'))
+# Entries are refreshed in the background from this long before they expire.
+REFRESH_AHEAD = float(os.getenv('DNS_CACHE_REFRESH_AHEAD_SECONDS', '5'))
+# How long an expired answer may still be used while fresh lookups fail.
+STALE_GRACE = float(os.getenv('DNS_CACHE_STALE_SECONDS', '3600'))
+LOOKUP_TIMEOUT = 2.0
+
+
+class DNSCache:
+    """A records cached for their published TTL (clamped).
+
+    Requests only wait on a lookup for a host seen for the first time (or after
+    STALE_GRACE without a successful refresh). Otherwise the cached answer is
+    returned and, once it is close to expiry, refreshed on a background thread.
+    """
+
+    def __init__(self, nameservers=None):
+        try:
+            self.resolver = dns.resolver.Resolver(configure=not nameservers)
+        except dns.resolver.NoResolverConfiguration:
+            self.resolver = None
+        if nameservers:
+            self.resolver.nameservers = nameservers
+        self._entries = {}  # host -> (addresses, expires_at, rotation)
+        self._refresh_after = {}  # host -> earliest start of the next background refresh
+        self._lock = Lock()
+
+    def _lookup(self, host):
+        try:
+            if self.resolver is None:
+                raise dns.resolver.NoResolverConfiguration('no nameservers configured')
+            answer = self.resolver.resolve(host, 'A', lifetime=LOOKUP_TIMEOUT)
+            return [record.to_text() for record in answer], answer.rrset.ttl
+        except dns.exception.DNSException as e:
+            # Fall back to the system resolver (hosts file, search domains, IPv6-only networks).
+            logger.debug('dnspython lookup of %s failed (%s), using getaddrinfo', host, e)
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            infos.sort(key=lambda info: info[0] != socket.AF_INET)
+            return list(dict.fromkeys(info[4][0] for info in infos)), MIN_TTL
+
+    def refresh(self, host):
+        """Resolve host now and store the answer; raises socket.gaierror on failure."""
+        addresses, ttl = self._lookup(host)
+        if not addresses:
+            raise socket.gaierror(f'No addresses for {host}')
+        expires_at = time.monotonic() + min(max(ttl, MIN_TTL), MAX_TTL)
+        with self._lock:
+            self._entries[host] = (addresses, expires_at, itertools.count())
+            self._refresh_after.pop(host, None)
+        return addresses
+
+    def _refresh_soon(self, host, now):
+        with self._lock:
+            # One background lookup per host at a time; after a failure, wait MIN_TTL before retrying.
+            if self._refresh_after.get(host, 0) > now:
+                return
+            self._refresh_after[host] = now + MIN_TTL
+        Thread(target=self._refresh_in_background, args=(host,), name=f'dns-refresh-{host}', daemon=True).start()
+
+    def _refresh_in_background(self, host):
+        try:
+            self.refresh(host)
+        except OSError as e:
+            logger.warning('DNS refresh for %s failed, using cached addresses: %s', host, e)
+
+    def resolve(self, host):
+        """Return the addresses for host, starting at a different one each call to spread connections."""
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        entry = self._entries.get(host)
+        now = time.monotonic()
+        if entry is None or now - entry[1] > STALE_GRACE:
+            try:
+                self.refresh(host)
+            except OSError as e:
+                raise socket.gaierror(f'Could not resolve {host}: {e}') from e
+            entry = self._entries[host]
+        elif entry[1] - now <= REFRESH_AHEAD:
+            self._refresh_soon(host, now)
+        addresses, _, turn = entry
+        start = next(turn) % len(addresses)
+        return addresses[start:] + addresses[:start]
+
+    def forget(self, host):
+        with self._lock:
+            self._entries.pop(host, None)
+            self._refresh_after.pop(host, None)
+
+
+cache = DNSCache([ns.strip() for ns in os.getenv('DNS_NAMESERVERS', '').split(',') if ns.strip()] or None)
+
+
+class _CachedDNSConnectionMixin:
+    """Connects to an address from the DNS cache; Host header, SNI and certificate checks still use the hostname."""
+
+    def _new_conn(self):
+        try:
+            addresses = cache.resolve(self._dns_host)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        error = None
+        for address in addresses:
+            try:
+                return connection.create_connection((address, self.port), self.timeout,
+                                                    source_address=self.source_address,
+                                                    socket_options=self.socket_options)
+            except socket.timeout as e:
+                error = ConnectTimeoutError(self, f'Connection to {self.host} ({address}) timed out. '
+                                                  f'(connect timeout={self.timeout})')
+                error.__cause__ = e
+            except OSError as e:
+                error = NewConnectionError(self, f'Failed to establish a new connection to {address}: {e}')
+                error.__cause__ = e
+        # Every cached address failed; they may have moved, so look the host up again next time.
+        cache.forget(self._dns_host)
+        raise error
+
+
+class CachedDNSHTTPConnection(_CachedDNSConnectionMixin, HTTPConnection):
+    pass
+
+
+class CachedDNSHTTPSConnection(_CachedDNSConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CachedDNSHTTPConnection
+
+
+class _CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDNSHTTPSConnection
+
+
+class CachedDNSAdapter(HTTPAdapter):
+    """requests adapter whose new connections resolve hosts through the shared DNSCache."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CachedDNSHTTPConnectionPool,
+            'https': _CachedDNSHTTPSConnectionPool,
+        }
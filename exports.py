@@ -0,0 +1,85 @@
+from extensions import db
+from models import User, Payment, Ticket, Movie
+from sqlalchemy import select
+import csv
+import io
+import json
+
+# Rows fetched per round trip from the server-side cursor.
+YIELD_PER = 1000
+CSV_FLUSH_ROWS = 200
+
+# dataset -> (model, base columns)
+DATASETS = {
+    'tickets': (Ticket, [Ticket.id, Ticket.token, Ticket.ticket_type, Ticket.movie_id, Ticket.user_id,
+                         Ticket.payment_id, Ticket.created_at]),
+    'payments': (Payment, [Payment.id, Payment.paystack_ref, Payment.status, Payment.amount, Payment.ticket_type,
+                           Payment.movie_id, Payment.user_id, Payment.created_at]),
+    'users': (User, [User.id, User.email, User.phone, User.is_admin, User.created_at]),
+}
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def build_export_query(dataset, include=(), movie_id=None, created_from=None, created_to=None, ticket_type=None,
+                       status=None):
+    """Build the column select for an export, optionally joining movie titles and user contacts."""
+    model, columns = DATASETS[dataset]
+    columns = list(columns)
+    query_joins = []
+    if dataset != 'users':
+        if 'movie' in include:
+            columns.append(Movie.title.label('movie_title'))
+            query_joins.append((Movie, Movie.id == model.movie_id))
+        if 'user' in include:
+            columns += [User.email.label('user_email'), User.phone.label('user_phone')]
+            query_joins.append((User, User.id == model.user_id))
+
+    query = select(*columns).select_from(model)
+    for target, onclause in query_joins:
+        query = query.outerjoin(target, onclause)
+    if movie_id is not None and dataset != 'users':
+        query = query.where(model.movie_id == movie_id)
+    if ticket_type and dataset != 'users':
+        query = query.where(model.ticket_type == ticket_type)
+    if status and dataset == 'payments':
+        query = query.where(Payment.status == status)
+    if created_from:
+        query = query.where(model.created_at >= created_from)
+    if created_to:
+        query = query.where(model.created_at < created_to)
+    return query.order_by(model.id)
+
+
+def _rows(query):
+    result = db.session.execute(query.execution_options(yield_per=YIELD_PER))
+    try:
+        yield list(result.keys())
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def stream_csv(query):
+    """Yield CSV text in small chunks while rows stream from the database."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for count, row in enumerate(_rows(query)):
+        writer.writerow(row)
+        if count % CSV_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(query):
+    """Yield one JSON object per line while rows stream from the database."""
+    rows = _rows(query)
+    keys = next(rows)
+    for row in rows:
+        yield json.dumps(dict(zip(keys, row)), default=str) + '\n'
+
+
+def stream_export(query, fmt):
+    return stream_csv(query) if fmt == 'csv' else stream_ndjson(query)
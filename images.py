@@ -0,0 +1,159 @@
+from flask import url_for, send_file
+from extensions import db
+from models import FlierImage, FlierRendition, Movie
+from metrics import track_image
+from PIL import Image
+import hashlib
+import io
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Digest URLs never change content, so they can be cached for a year.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# variant -> (bounding box, {format: quality})
+RENDITIONS = {
+    'thumbnail': ((320, 320), {'webp': 70, 'jpeg': 75}),
+    'medium': ((800, 800), {'webp': 78, 'jpeg': 82}),
+    'full': ((1600, 1600), {'webp': 82, 'jpeg': 85}),
+}
+# The full JPEG is the canonical flier referenced by movies.flier_hash.
+MASTER_RENDITION = ('full', 'jpeg')
+PIL_FORMATS = {'jpeg': 'JPEG', 'webp': 'WEBP'}
+
+
+def store_flier(image_data, content_type='image/jpeg', width=None, height=None):
+    """Store flier bytes under their SHA-256 digest, reusing an existing copy."""
+    digest = hashlib.sha256(image_data).hexdigest()
+    flier = db.session.get(FlierImage, digest)
+    if not flier:
+        flier = FlierImage(sha256=digest, content_type=content_type, size=len(image_data),
+                           width=width, height=height, data=image_data)
+        db.session.add(flier)
+    return flier
+
+
+def generate_renditions(image_data):
+    """Decode an upload once and encode every variant/format in RENDITIONS."""
+    with track_image('renditions'):
+        source = Image.open(io.BytesIO(image_data))
+        source = source.convert('RGB')
+        renditions = {}
+        for variant, (max_size, qualities) in RENDITIONS.items():
+            img = source.copy()
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            for fmt, quality in qualities.items():
+                output = io.BytesIO()
+                img.save(output, format=PIL_FORMATS[fmt], quality=quality, optimize=True)
+                renditions[(variant, fmt)] = (output.getvalue(), img.width, img.height)
+    return renditions
+
+
+def store_flier_renditions(image_data, source_hash=None):
+    """Generate and store all renditions of an upload, returning the master flier.
+
+    Raises PIL.UnidentifiedImageError if the upload is not a readable image.
+    """
+    renditions = generate_renditions(image_data)
+    stored = {}
+    for (variant, fmt), (data, width, height) in renditions.items():
+        stored[(variant, fmt)] = store_flier(data, f'image/{fmt}', width, height)
+    master = stored[MASTER_RENDITION]
+    source_hash = source_hash or master.sha256
+    for (variant, fmt), flier in stored.items():
+        if not FlierRendition.query.filter_by(source_hash=source_hash, variant=variant, format=fmt).first():
+            db.session.add(FlierRendition(source_hash=source_hash, variant=variant, format=fmt, image_hash=flier.sha256))
+    return master
+
+
+def _digest_url(digest):
+    return url_for('api.get_flier', digest=digest, _external=True)
+
+
+def image_url(flier):
+    """Return the public, content-addressed URL of a stored image."""
+    return _digest_url(flier.sha256)
+
+
+def flier_url(movie):
+    """Return the public, content-addressed URL of a movie's flier."""
+    if not movie.flier_hash:
+        return None
+    return _digest_url(movie.flier_hash)
+
+
+def rendition_urls(movies):
+    """Map movie id -> {variant: {format: url}} using a single query."""
+    hashes = {m.flier_hash for m in movies if m.flier_hash}
+    by_source = {}
+    if hashes:
+        rows = db.session.query(FlierRendition.source_hash, FlierRendition.variant,
+                                FlierRendition.format, FlierRendition.image_hash) \
+            .filter(FlierRendition.source_hash.in_(hashes)).all()
+        for source_hash, variant, fmt, image_hash in rows:
+            by_source.setdefault(source_hash, {}).setdefault(variant, {})[fmt] = _digest_url(image_hash)
+    return {m.id: by_source.get(m.flier_hash, {}) for m in movies}
+
+
+def get_rendition(movie, variant='medium', fmt='jpeg'):
+    """Return the stored FlierImage for a movie's variant, or its master flier."""
+    if not movie.flier_hash:
+        return None
+    rendition = FlierRendition.query.filter_by(source_hash=movie.flier_hash, variant=variant, format=fmt).first()
+    return rendition.image if rendition else movie.flier
+
+
+def email_image_url(flier):
+    """Absolute URL for showing a stored image in an email.
+
+    Ticket emails are also rendered by the background worker, outside any
+    request, so the address is built from BACKEND_URL rather than the request host.
+    """
+    if not flier:
+        return None
+    return f"{os.environ['BACKEND_URL'].rstrip('/')}/api/fliers/{flier.sha256}"
+
+
+def send_flier(flier, max_age=IMMUTABLE_MAX_AGE, immutable=True):
+    """Stream a stored flier from memory with ETag, Last-Modified and Range support."""
+    response = send_file(
+        io.BytesIO(flier.data),
+        mimetype=flier.content_type,
+        etag=flier.sha256,
+        last_modified=flier.created_at,
+        max_age=max_age,
+        conditional=True
+    )
+    response.cache_control.immutable = immutable
+    return response
+
+
+def backfill_flier_store():
+    """Move inline fliers into the store and render variants for fliers lacking them."""
+    movies = Movie.query.filter(Movie.flier_hash.is_(None), Movie.flier_image.isnot(None)).all()
+    for movie in movies:
+        movie.flier_hash = store_flier(movie.flier_image).sha256
+        movie.flier_image = None
+    if movies:
+        db.session.commit()
+        logger.info('Moved %s flier(s) into the image store', len(movies))
+
+    rendered = db.session.query(FlierRendition.source_hash)
+    pending = db.session.query(Movie.flier_hash).filter(Movie.flier_hash.isnot(None),
+                                                        Movie.flier_hash.notin_(rendered)).distinct().all()
+    for (source_hash,) in pending:
+        try:
+            store_flier_renditions(db.session.get(FlierImage, source_hash).data, source_hash=source_hash)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning('Could not render variants for flier %s: %s', source_hash, e)
+
+    if movies or pending:
+        from catalogue import bump_catalogue_version
+        from settings import invalidate_settings
+        bump_catalogue_version()
+        db.session.commit()
+        invalidate_settings()
@@ -0,0 +1,106 @@
+from extensions import db
+from models import MovieInventory, SeatHold, Ticket
+from settings import get_setting
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long a pending Paystack checkout keeps its VIP seat.
+HOLD_TTL = timedelta(minutes=int(os.getenv('VIP_HOLD_MINUTES', '30')))
+
+
+class SoldOut(Exception):
+    pass
+
+
+def vip_limit():
+    return get_setting('vip_limit')
+
+
+def _lock(movie_id, confirming_payment_id=None):
+    """Return the movie's inventory row locked FOR UPDATE, creating it on first use.
+
+    confirming_payment_id names a payment whose ticket is already flushed but whose
+    sale the caller is about to count; it is left out of the seed.
+    """
+    inventory = MovieInventory.query.filter_by(movie_id=movie_id).with_for_update().first()
+    if inventory:
+        return inventory
+    # Seed the counter once from issued tickets; afterwards it is maintained incrementally.
+    issued = Ticket.query.filter_by(movie_id=movie_id, ticket_type='vip')
+    if confirming_payment_id is not None:
+        issued = issued.filter(db.or_(Ticket.payment_id.is_(None), Ticket.payment_id != confirming_payment_id))
+    sold = issued.count()
+    try:
+        with db.session.begin_nested():
+            db.session.add(MovieInventory(movie_id=movie_id, vip_sold=sold, updated_at=datetime.utcnow()))
+    except IntegrityError:
+        pass  # Another transaction created it first.
+    return MovieInventory.query.filter_by(movie_id=movie_id).with_for_update().populate_existing().one()
+
+
+def _active_holds(movie_id, now):
+    SeatHold.query.filter(SeatHold.movie_id == movie_id, SeatHold.expires_at <= now) \
+        .delete(synchronize_session=False)
+    return db.session.query(db.func.coalesce(db.func.sum(SeatHold.quantity), 0)) \
+        .filter(SeatHold.movie_id == movie_id).scalar()
+
+
+def reserve_vip(movie_id, quantity=1):
+    """Hold VIP seats for a pending checkout; raises SoldOut if none are left.
+
+    The hold counts against the limit until it is confirmed, released, or expires.
+    """
+    now = datetime.utcnow()
+    inventory = _lock(movie_id)
+    held = _active_holds(movie_id, now)
+    if inventory.vip_sold + held + quantity > vip_limit():
+        raise SoldOut(f'VIP sold out: {inventory.vip_sold} sold, {held} held')
+    hold = SeatHold(movie_id=movie_id, ticket_type='vip', quantity=quantity, expires_at=now + HOLD_TTL)
+    db.session.add(hold)
+    return hold
+
+
+def allocate_vip(movie_id, quantity=1):
+    """Take VIP seats immediately, as for admin-issued tickets; raises SoldOut if none are left."""
+    now = datetime.utcnow()
+    inventory = _lock(movie_id)
+    held = _active_holds(movie_id, now)
+    if inventory.vip_sold + held + quantity > vip_limit():
+        raise SoldOut(f'VIP sold out: {inventory.vip_sold} sold, {held} held')
+    inventory.vip_sold += quantity
+    inventory.updated_at = now
+
+
+def confirm_payment(payment):
+    """Turn a paid VIP checkout's hold into a sale.
+
+    A payment that already succeeded at Paystack is always honoured, even if its
+    hold has expired in the meantime.
+    """
+    if payment.ticket_type != 'vip':
+        return
+    inventory = _lock(payment.movie_id, confirming_payment_id=payment.id)
+    hold = SeatHold.query.filter_by(payment_id=payment.id).first()
+    quantity = hold.quantity if hold else 1
+    if hold:
+        db.session.delete(hold)
+    else:
+        logger.warning('No active VIP hold for payment %s, counting the sale anyway', payment.id)
+    inventory.vip_sold += quantity
+    inventory.updated_at = datetime.utcnow()
+
+
+def release_payment(payment):
+    """Drop the hold of a checkout that failed or was abandoned."""
+    SeatHold.query.filter_by(payment_id=payment.id).delete(synchronize_session=False)
+
+
+def release_vip(movie_id, quantity=1):
+    """Return sold VIP seats to the pool, e.g. when VIP tickets are deleted."""
+    inventory = _lock(movie_id)
+    inventory.vip_sold = max(inventory.vip_sold - quantity, 0)
+    inventory.updated_at = datetime.utcnow()
@@ -0,0 +1,120 @@
+from flask import g, request, has_request_context
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+import os
+
+# Attributes every LogRecord has; anything else was passed via extra= and is emitted as a field.
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+logger = logging.getLogger('request')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and any extra fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RESERVED})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records made while serving a request with its id, so lines can be correlated."""
+
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+        return True
+
+
+class _EnqueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Resolve the message now, since args may change before the listener runs, but keep
+        # the extra fields structured; the listener's JsonFormatter does the formatting.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_sample_rates(value):
+    """Parse "/api/movies=0.01,/api/image=0.1" into {path prefix: rate}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        prefix, _, rate = item.partition('=')
+        rates[prefix] = float(rate)
+    return rates
+
+
+def configure_logging(app):
+    """Route all logging through a queue drained by a background thread, and time every request.
+
+    LOG_LEVEL sets the level (default INFO). LOG_SAMPLE_RATES keeps only a
+    fraction of access lines for hot paths; errors and requests slower than
+    LOG_SLOW_MS are always logged.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = _EnqueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, output, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    app.extensions['log_listener'] = listener
+
+    sample_rates = _parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+    slow_ms = float(os.getenv('LOG_SLOW_MS', '1000'))
+
+    def sample_rate(path):
+        matches = [prefix for prefix in sample_rates if path.startswith(prefix)]
+        return sample_rates[max(matches, key=len)] if matches else 1.0
+
+    @app.before_request
+    def start_request_timer():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        response.headers['X-Request-ID'] = g.request_id
+        if response.status_code < 500 and duration_ms < slow_ms and random.random() >= sample_rate(request.path):
+            return response
+        level = logging.ERROR if response.status_code >= 500 else logging.INFO
+        logger.log(level, 'request', extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'origin': request.headers.get('Origin'),
+            'remote_addr': request.remote_addr,
+        })
+        return response
+
+    return listener
@@ -0,0 +1,110 @@
+from notifications import enqueue_email, enqueue_whatsapp
+from images import get_rendition, email_image_url
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import escape
+from collections import namedtuple
+from functools import lru_cache
+import re
+import os
+
+# Ticket and reminder messages are rendered in two stages. Everything shared by a
+# send (movie details, schedule, flier, reminder text) is rendered once and cached
+# as literal chunks; each recipient then only fills in the fields below.
+RECIPIENT_FIELDS = ('recipient', 'ticket_token')
+CACHE_SIZE = int(os.getenv('MESSAGE_TEMPLATE_CACHE_SIZE', '256'))
+
+_MARKER = re.compile('\x00(' + '|'.join(RECIPIENT_FIELDS) + ')\x00')
+# Placeholders left in batched email bodies; SendGrid fills them per personalization.
+# Admin-entered text reaches those bodies autoescaped, so it can never contain a raw
+# '<' or '>' and cannot collide with a tag.
+SUBSTITUTION_TAGS = {field: f'<%{field}%>' for field in RECIPIENT_FIELDS}
+
+MovieDetails = namedtuple('MovieDetails', 'id title premiere_date event_time event_location')
+
+
+def _long_date(value):
+    """22nd November 2025"""
+    day = value.day
+    suffix = 'th' if 11 <= day % 100 <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f'{day}{suffix} {value:%B %Y}'
+
+
+_env = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')),
+    autoescape=select_autoescape(['html']),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True,
+    auto_reload=False,
+)
+_env.filters['long_date'] = _long_date
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _prepare(template_name, movie, **shared):
+    """Render the shared parts of a message once; returns alternating literal chunks and field names."""
+    markers = {field: f'\x00{field}\x00' for field in RECIPIENT_FIELDS}
+    rendered = _env.get_template(template_name).render(movie=movie, **shared, **markers)
+    return tuple(_MARKER.split(rendered)), template_name.endswith('.html')
+
+
+def _details(movie):
+    return MovieDetails(movie.id, movie.title, movie.premiere_date, movie.event_time, movie.event_location)
+
+
+def _render(template_name, movie, recipient_values, **shared):
+    parts, is_html = _prepare(template_name, _details(movie), **shared)
+    out = []
+    for index, part in enumerate(parts):
+        if index % 2 == 0:
+            out.append(part)
+        else:
+            value = recipient_values.get(part) or ''
+            out.append(str(escape(value)) if is_html else str(value))
+    return ''.join(out)
+
+
+def _render_tagged(template_name, movie, **shared):
+    parts, _ = _prepare(template_name, _details(movie), **shared)
+    return ''.join(part if index % 2 == 0 else SUBSTITUTION_TAGS[part] for index, part in enumerate(parts))
+
+
+def email_substitutions(recipient, ticket_token=None):
+    """Per-recipient values for a body from ticket_email_batch/reminder_email_batch, HTML-escaped."""
+    values = {'recipient': recipient, 'ticket_token': ticket_token}
+    return {tag: str(escape(values[field] or '')) for field, tag in SUBSTITUTION_TAGS.items()}
+
+
+def ticket_email(movie, recipient, ticket_token, ticket_type_label='VIP', flier_src=None):
+    """HTML ticket confirmation; flier_src is the flier's image URL, or None to leave it out."""
+    return _render('email/ticket.html', movie, {'recipient': recipient, 'ticket_token': ticket_token},
+                   ticket_type_label=ticket_type_label, flier_src=flier_src)
+
+
+def ticket_whatsapp(movie, recipient, ticket_token, ticket_type_label='VIP'):
+    return _render('whatsapp/ticket.txt', movie, {'recipient': recipient, 'ticket_token': ticket_token},
+                   ticket_type_label=ticket_type_label)
+
+
+def reminder_whatsapp(movie, recipient, message):
+    return _render('whatsapp/reminder.txt', movie, {'recipient': recipient}, message=message)
+
+
+def ticket_email_batch(movie, ticket_type_label='VIP', flier_src=None):
+    """One ticket email body for a whole batch, with substitution tags for the recipient and token."""
+    return _render_tagged('email/ticket.html', movie, ticket_type_label=ticket_type_label, flier_src=flier_src)
+
+
+def reminder_email_batch(movie, message, flier_src=None):
+    return _render_tagged('email/reminder.html', movie, message=message, flier_src=flier_src)
+
+
+def queue_ticket_notifications(user, movie, ticket_type, ticket_token):
+    """Queue the ticket email and WhatsApp message; they are sent after the caller commits."""
+    ticket_type_label = 'VIP' if ticket_type == 'vip' else 'Regular'
+    flier = get_rendition(movie, 'medium', 'jpeg')
+    email_message = ticket_email(movie, user.email, ticket_token, ticket_type_label, email_image_url(flier))
+    enqueue_email(user.email, f'{ticket_type_label} Ticket for {movie.title}', email_message)
+    if user.phone:
+        whatsapp_message = ticket_whatsapp(movie, user.phone, ticket_token, ticket_type_label)
+        enqueue_whatsapp(user.phone, whatsapp_message, flier)
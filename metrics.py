@@ -0,0 +1,183 @@
+from flask import Response, g, request, has_request_context
+from sqlalchemy import event
+from contextlib import contextmanager
+from threading import Lock
+import bisect
+import time
+import os
+
+# Latency buckets in seconds, and count buckets for queries per request.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _format_value(bound)
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", le)])} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}')
+                lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route.',
+                            ('method', 'route', 'status'))
+DB_QUERIES = Histogram('db_queries_per_request', 'SQL statements executed per request.',
+                       ('route',), buckets=COUNT_BUCKETS)
+DB_QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Latency of individual SQL statements.', ('route',))
+DB_TIME = Histogram('db_time_per_request_seconds', 'Total time spent in SQL per request.', ('route',))
+EXTERNAL_LATENCY = Histogram('external_call_duration_seconds', 'Latency of calls to external providers.',
+                             ('provider', 'operation', 'outcome'))
+IMAGE_LATENCY = Histogram('image_processing_seconds', 'Time spent decoding and encoding images.', ('operation',))
+RECONCILE_RUN = Histogram('payment_reconcile_run_seconds', 'Duration of a pending-payment reconciliation run.')
+RECONCILE_OUTCOMES = Counter('payment_reconcile_total', 'Stale pending payments checked, by outcome.', ('outcome',))
+RECONCILE_BACKLOG = Gauge('payment_reconcile_backlog', 'Stale pending payments left after the last run.')
+REGISTRY = [REQUEST_LATENCY, DB_QUERIES, DB_QUERY_LATENCY, DB_TIME, EXTERNAL_LATENCY, IMAGE_LATENCY,
+            RECONCILE_RUN, RECONCILE_OUTCOMES, RECONCILE_BACKLOG]
+
+
+def _route():
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@contextmanager
+def track_call(provider, operation):
+    """Time a call to an external provider; exceptions are recorded as outcome="error"."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        EXTERNAL_LATENCY.observe(time.perf_counter() - started, provider=provider, operation=operation,
+                                 outcome=outcome)
+
+
+@contextmanager
+def track_image(operation):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        IMAGE_LATENCY.observe(time.perf_counter() - started, operation=operation)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so a failed statement leaves nothing behind.
+    context.metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.metrics_started
+    route = _route()
+    DB_QUERY_LATENCY.observe(elapsed, route=route)
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+
+
+def render_metrics():
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+def init_metrics(app, db):
+    """Record request, SQL and provider timings, and serve them at /metrics.
+
+    Metrics are kept per process. If METRICS_TOKEN is set, scrapes must send
+    it as a bearer token.
+    """
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_metrics():
+        g.metrics_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    @app.after_request
+    def record_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None or request.path == '/metrics':
+            return response
+        route = _route()
+        REQUEST_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route,
+                                status=response.status_code)
+        DB_QUERIES.observe(g.db_queries, route=route)
+        DB_TIME.observe(g.db_time, route=route)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = os.getenv('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
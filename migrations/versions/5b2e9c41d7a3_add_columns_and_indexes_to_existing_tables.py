@@ -0,0 +1,109 @@
+"""Add columns, indexes and ticket_token_seq to the original tables
+
+Tables that did not exist before (flier_images, seat_holds, notification_outbox,
+...) are created by db.create_all() in init_db; create_all never alters a table
+that already exists, so this revision brings movies, payments and tickets up to
+the current models. Every step is skipped when already applied, so it also runs
+cleanly on a database that create_all built from the current models.
+
+After upgrading, run `flask backfill-fliers` once to move inline fliers into
+the image store.
+
+Revision ID: 5b2e9c41d7a3
+Revises:
+Create Date: 2026-10-17 03:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e9c41d7a3'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_movies_flier_hash', 'movies', ['flier_hash']),
+    ('ix_payments_user_id', 'payments', ['user_id']),
+    ('ix_payments_movie_id', 'payments', ['movie_id']),
+    ('ix_payments_status_created_at', 'payments', ['status', 'created_at']),
+    ('ix_tickets_user_id', 'tickets', ['user_id']),
+    ('ix_tickets_created_at_id', 'tickets', ['created_at', 'id']),
+    ('ix_tickets_movie_created_at_id', 'tickets', ['movie_id', 'created_at', 'id']),
+    ('ix_tickets_type_created_at_id', 'tickets', ['ticket_type', 'created_at', 'id']),
+]
+ticket_token_seq = sa.Sequence('ticket_token_seq')
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _payment_id_is_unique():
+    inspector = sa.inspect(op.get_bind())
+    unique_sets = [c['column_names'] for c in inspector.get_unique_constraints('tickets')]
+    unique_sets += [i['column_names'] for i in inspector.get_indexes('tickets') if i['unique']]
+    return ['payment_id'] in unique_sets
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if 'flier_hash' not in _columns('movies'):
+        op.add_column('movies', sa.Column('flier_hash', sa.String(length=64), nullable=True))
+        if bind.dialect.name != 'sqlite':
+            op.create_foreign_key('movies_flier_hash_fkey', 'movies', 'flier_images', ['flier_hash'], ['sha256'])
+    if 'reconciled_at' not in _columns('payments'):
+        op.add_column('payments', sa.Column('reconciled_at', sa.DateTime(), nullable=True))
+    if 'notified_at' not in _columns('tickets'):
+        op.add_column('tickets', sa.Column('notified_at', sa.DateTime(), nullable=True))
+
+    for name, table, columns in INDEXES:
+        if name not in _indexes(table):
+            op.create_index(name, table, columns)
+
+    if not _payment_id_is_unique():
+        # Repeated confirmations could issue several tickets for one payment. Keep the
+        # first one attached to it; the others stay valid for entry but are unlinked.
+        op.execute(
+            'UPDATE tickets SET payment_id = NULL WHERE payment_id IS NOT NULL AND id NOT IN '
+            '(SELECT keep.id FROM (SELECT MIN(id) AS id FROM tickets '
+            'WHERE payment_id IS NOT NULL GROUP BY payment_id) AS keep)'
+        )
+        if bind.dialect.name == 'sqlite':
+            op.create_index('tickets_payment_id_key', 'tickets', ['payment_id'], unique=True)
+        else:
+            op.create_unique_constraint('tickets_payment_id_key', 'tickets', ['payment_id'])
+
+    if bind.dialect.supports_sequences:
+        op.execute(sa.schema.CreateSequence(ticket_token_seq, if_not_exists=True))
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.supports_sequences:
+        op.execute(sa.schema.DropSequence(ticket_token_seq, if_exists=True))
+
+    if bind.dialect.name == 'sqlite':
+        op.drop_index('tickets_payment_id_key', table_name='tickets')
+    else:
+        op.drop_constraint('tickets_payment_id_key', 'tickets', type_='unique')
+
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+
+    with op.batch_alter_table('tickets') as batch_op:
+        batch_op.drop_column('notified_at')
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('reconciled_at')
+    if bind.dialect.name != 'sqlite':
+        op.drop_constraint('movies_flier_hash_fkey', 'movies', type_='foreignkey')
+    with op.batch_alter_table('movies') as batch_op:
+        batch_op.drop_column('flier_hash')
@@ -0,0 +1,74 @@
+"""A stand-in for the parts of the Paystack API this app calls, for local runs and tests.
+
+    python mock_paystack.py            # serves on MOCK_PAYSTACK_PORT (default 5055)
+    PAYSTACK_BASE_URL=http://localhost:5055 python app.py
+
+Transactions start with MOCK_PAYSTACK_STATUS (default "success"). Change one
+with POST /_mock/transactions/<reference> {"status": "abandoned"}, or make
+every call fail with POST /_mock/outage {"status_code": 503}.
+"""
+from flask import Flask, request, jsonify
+from threading import Lock
+import secrets
+import os
+
+
+def create_mock_app(default_status=None):
+    app = Flask(__name__)
+    default_status = default_status or os.getenv('MOCK_PAYSTACK_STATUS', 'success')
+    state = {'transactions': {}, 'outage': None}
+    lock = Lock()
+    app.extensions['mock_paystack'] = state
+
+    @app.before_request
+    def simulate_outage():
+        if state['outage'] and not request.path.startswith('/_mock/'):
+            return jsonify({'status': False, 'message': 'Simulated outage'}), state['outage']
+
+    @app.route('/transaction/initialize', methods=['POST'])
+    def initialize():
+        data = request.get_json(silent=True) or {}
+        if not data.get('email') or not data.get('amount'):
+            return jsonify({'status': False, 'message': 'Email and amount are required'}), 400
+        reference = data.get('reference') or secrets.token_hex(8)
+        with lock:
+            state['transactions'][reference] = {
+                'id': len(state['transactions']) + 1,
+                'reference': reference,
+                'amount': int(data['amount']),
+                'status': default_status,
+                'metadata': data.get('metadata'),
+            }
+        return jsonify({'status': True, 'message': 'Authorization URL created', 'data': {
+            'authorization_url': f'{request.host_url}checkout/{reference}',
+            'access_code': reference,
+            'reference': reference,
+        }})
+
+    @app.route('/transaction/verify/<reference>')
+    def verify(reference):
+        transaction = state['transactions'].get(reference)
+        if transaction is None:
+            return jsonify({'status': False, 'message': 'Transaction reference not found'}), 400
+        return jsonify({'status': True, 'message': 'Verification successful',
+                        'data': dict(transaction, gateway_response=transaction['status'])})
+
+    @app.route('/_mock/transactions/<reference>', methods=['POST'])
+    def set_status(reference):
+        data = request.get_json(silent=True) or {}
+        with lock:
+            transaction = state['transactions'].setdefault(reference, {
+                'id': len(state['transactions']) + 1, 'reference': reference, 'amount': 0, 'metadata': None})
+            transaction['status'] = data.get('status', default_status)
+        return jsonify(transaction)
+
+    @app.route('/_mock/outage', methods=['POST'])
+    def set_outage():
+        state['outage'] = (request.get_json(silent=True) or {}).get('status_code')
+        return jsonify({'outage': state['outage']})
+
+    return app
+
+
+if __name__ == '__main__':
+    create_mock_app().run(host='127.0.0.1', port=int(os.getenv('MOCK_PAYSTACK_PORT', 5055)), threaded=True)
@@ -1,7 +1,11 @@
 from extensions import db
 from werkzeug.security import generate_password_hash, check_password_hash
-import random
-import string
+from tokens import encode_token, PAYLOAD_BITS
+from datetime import datetime
+import secrets
+
+# Password hash for accounts created on a guest's behalf (admin VIP lists); no password matches it.
+UNUSABLE_PASSWORD = '!'
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -11,6 +15,8 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    payments = db.relationship('Payment', backref='user', lazy='select', order_by='Payment.id')
+    tickets = db.relationship('Ticket', backref='user', lazy='select', order_by='Ticket.id')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -18,43 +24,185 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+class FlierImage(db.Model):
+    __tablename__ = 'flier_images'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    content_type = db.Column(db.String(50), nullable=False, default='image/jpeg')
+    size = db.Column(db.Integer, nullable=False)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
+class FlierRendition(db.Model):
+    __tablename__ = 'flier_renditions'
+    __table_args__ = (db.UniqueConstraint('source_hash', 'variant', 'format', name='uq_flier_rendition'),)
+    id = db.Column(db.Integer, primary_key=True)
+    source_hash = db.Column(db.String(64), db.ForeignKey('flier_images.sha256'), nullable=False, index=True)
+    variant = db.Column(db.String(20), nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    image_hash = db.Column(db.String(64), db.ForeignKey('flier_images.sha256'), nullable=False)
+    image = db.relationship('FlierImage', foreign_keys=[image_hash], lazy='joined')
+
+class TwilioMedia(db.Model):
+    __tablename__ = 'twilio_media_cache'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    media_url = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
 class Movie(db.Model):
     __tablename__ = 'movies'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     premiere_date = db.Column(db.Date, nullable=False)
-    flier_image = db.Column(db.LargeBinary, nullable=True)
+    # Legacy inline copy of the flier; new uploads live in flier_images.
+    flier_image = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    flier_hash = db.Column(db.String(64), db.ForeignKey('flier_images.sha256'), nullable=True, index=True)
+    flier = db.relationship('FlierImage', lazy='select')
     price = db.Column(db.Numeric(10, 2), nullable=False)
     event_time = db.Column(db.String(10), nullable=True, default='6pm')
     event_location = db.Column(db.String(255), nullable=True, default='Ozone Cinema, Yaba')
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (db.Index('ix_payments_status_created_at', 'status', 'created_at'),)
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), index=True)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     paystack_ref = db.Column(db.String(255), nullable=False)
     status = db.Column(db.String(50), nullable=False)
     ticket_type = db.Column(db.String(10), nullable=False, default='regular')
     created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    # Last time the reconciler asked Paystack about this payment while it was pending.
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+
+ticket_token_seq = db.Sequence('ticket_token_seq', metadata=db.metadata)
 
 class Ticket(db.Model):
     __tablename__ = 'tickets'
+    # Keyset pagination on (created_at, id), optionally narrowed by movie or type.
+    __table_args__ = (
+        db.Index('ix_tickets_created_at_id', 'created_at', 'id'),
+        db.Index('ix_tickets_movie_created_at_id', 'movie_id', 'created_at', 'id'),
+        db.Index('ix_tickets_type_created_at_id', 'ticket_type', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    # One ticket per payment, however many confirmations (redirect, webhook, verify) arrive.
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), unique=True)
     movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'))
     token = db.Column(db.String(7), unique=True, nullable=False, index=True)
     ticket_type = db.Column(db.String(10), nullable=False, default='regular')
     created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    # When the ticket email/WhatsApp were queued; set in the same transaction as the ticket.
+    notified_at = db.Column(db.DateTime, nullable=True)
 
     @staticmethod
     def generate_token():
-        while True:
-            token = ''.join(random.choices(string.ascii_uppercase + string.digits, k=7))
-            if not Ticket.query.filter_by(token=token).first():
-                return token
+        return Ticket.generate_tokens(1)[0]
+
+    @staticmethod
+    def generate_tokens(count):
+        """Return `count` distinct tokens without checking the tickets table.
+
+        Tokens are derived from ticket_token_seq, so they are unique by
+        construction; the unique index on tickets.token remains the final
+        guard. Databases without sequences fall back to random 30-bit values.
+        """
+        if count <= 0:
+            return []
+        if db.engine.dialect.supports_sequences:
+            values = db.session.execute(
+                db.select(ticket_token_seq.next_value()).select_from(db.func.generate_series(1, count))
+            ).scalars().all()
+        else:
+            values = [secrets.randbits(PAYLOAD_BITS) for _ in range(count)]
+        return [encode_token(value) for value in values]
+
+class MovieInventory(db.Model):
+    __tablename__ = 'movie_inventory'
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), primary_key=True)
+    vip_sold = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+class SeatHold(db.Model):
+    __tablename__ = 'seat_holds'
+    id = db.Column(db.Integer, primary_key=True)
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False, index=True)
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=True, unique=True)
+    ticket_type = db.Column(db.String(10), nullable=False, default='vip')
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
+class NotificationOutbox(db.Model):
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (db.Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(20), nullable=False)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    media_flier_hash = db.Column(db.String(64), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    provider_id = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+class PaystackEvent(db.Model):
+    __tablename__ = 'paystack_events'
+    __table_args__ = (db.Index('ix_paystack_events_due', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    # "<event>:<transaction id or reference>"; Paystack redelivers the same event until it gets a 200.
+    dedupe_key = db.Column(db.String(255), unique=True, nullable=False)
+    event = db.Column(db.String(50), nullable=False)
+    reference = db.Column(db.String(255), nullable=True, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+class BulkJob(db.Model):
+    __tablename__ = 'bulk_jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    status = db.Column(db.String(30), nullable=False, default='queued', index=True)
+    # Shared subject and body for batched email jobs; recipients' fields are SendGrid substitution tags.
+    email_subject = db.Column(db.String(255), nullable=True)
+    email_template = db.Column(db.Text, nullable=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class BulkJobRecipient(db.Model):
+    __tablename__ = 'bulk_job_recipients'
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('bulk_jobs.id'), nullable=False, index=True)
+    channel = db.Column(db.String(20), nullable=False)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    # Empty for recipients of a batched email job, which use the job's email_template.
+    body = db.Column(db.Text, nullable=True)
+    media_flier_hash = db.Column(db.String(64), nullable=True)
+    ticket_token = db.Column(db.String(7), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    provider_id = db.Column(db.String(64), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
 
 class Setting(db.Model):
     __tablename__ = 'settings'
@@ -71,4 +219,10 @@ def init_db(app):
             db.session.add(Setting(key='vip_price', value='25000.00'))
         if not Setting.query.filter_by(key='vip_limit').first():
             db.session.add(Setting(key='vip_limit', value='50'))
-        db.session.commit()
\ No newline at end of file
+        if not Setting.query.filter_by(key='settings_version').first():
+            db.session.add(Setting(key='settings_version', value=secrets.token_hex(8)))
+        if not Setting.query.filter_by(key='catalogue_version').first():
+            db.session.add(Setting(key='catalogue_version', value=secrets.token_hex(8)))
+        db.session.commit()
+        from settings import load_settings
+        load_settings()
\ No newline at end of file
@@ -0,0 +1,161 @@
+from flask import current_app
+from sendgrid.helpers.mail import Mail, To
+from extensions import db
+from models import NotificationOutbox, FlierImage
+from twilio_media import get_twilio_media_url
+from metrics import track_call
+from retry_queue import claim_batch, record_failure
+from datetime import datetime
+from threading import Lock
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '6'))
+# SendGrid accepts at most 1000 personalizations per request.
+EMAIL_BATCH_LIMIT = 1000
+BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '20'))
+
+
+class LiveProvider:
+    """Delivers through the SendGrid and Twilio clients configured on the app."""
+
+    def send_email(self, recipient, subject, html):
+        sendgrid_client = current_app.config['SENDGRID_CLIENT']
+        if not sendgrid_client:
+            raise RuntimeError('SendGrid client not configured')
+        message = Mail(
+            from_email=current_app.config['FROM_EMAIL'],
+            to_emails=To(recipient),
+            subject=subject,
+            html_content=html
+        )
+        with track_call('sendgrid', 'send'):
+            response = sendgrid_client.send(message)
+        return str(response.status_code)
+
+    def send_email_batch(self, subject, html, recipients):
+        """Send one message to many recipients in a single request.
+
+        recipients is a list of (email, substitutions) pairs; each becomes its
+        own personalization, so recipients do not see each other.
+        """
+        sendgrid_client = current_app.config['SENDGRID_CLIENT']
+        if not sendgrid_client:
+            raise RuntimeError('SendGrid client not configured')
+        if len(recipients) > EMAIL_BATCH_LIMIT:
+            raise ValueError(f'At most {EMAIL_BATCH_LIMIT} recipients per batch')
+        message = Mail(
+            from_email=current_app.config['FROM_EMAIL'],
+            to_emails=[To(email, substitutions=substitutions) for email, substitutions in recipients],
+            subject=subject,
+            html_content=html,
+            is_multiple=True
+        )
+        with track_call('sendgrid', 'send_batch'):
+            response = sendgrid_client.send(message)
+        return str(response.status_code)
+
+    def send_whatsapp(self, phone, body, flier=None):
+        twilio_client = current_app.config['TWILIO_CLIENT']
+        if not twilio_client:
+            raise RuntimeError('Twilio client not configured')
+        media_url = []
+        if flier:
+            media_url = [url for url in [get_twilio_media_url(flier, twilio_client)] if url]
+        with track_call('twilio', 'message'):
+            response = twilio_client.messages.create(
+                from_=current_app.config['TWILIO_WHATSAPP_FROM'],
+                body=body,
+                media_url=media_url,
+                to=f"whatsapp:{phone}"
+            )
+        return response.sid
+
+
+class LocalProvider:
+    """In-memory stand-in for SendGrid/Twilio used in development and tests.
+
+    Set fail_next to make the next N sends raise, to exercise retries.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.fail_next = 0
+        self._lock = Lock()
+
+    def _record(self, channel, **message):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                raise RuntimeError(f'Simulated {channel} provider failure')
+            self.sent.append(dict(channel=channel, **message))
+            return f'local-{len(self.sent)}'
+
+    def send_email(self, recipient, subject, html):
+        return self._record('email', recipient=recipient, subject=subject, html=html)
+
+    def send_email_batch(self, subject, html, recipients):
+        # One record per call, like one SendGrid request; substitutions are applied for inspection.
+        messages = []
+        for email, substitutions in recipients:
+            body = html
+            for tag, value in substitutions.items():
+                body = body.replace(tag, value)
+            messages.append({'recipient': email, 'html': body})
+        return self._record('email_batch', subject=subject, messages=messages)
+
+    def send_whatsapp(self, phone, body, flier=None):
+        return self._record('whatsapp', recipient=phone, body=body, media=flier.sha256 if flier else None)
+
+
+def get_provider():
+    """Return the app's notification provider, chosen by NOTIFICATION_PROVIDER."""
+    provider = current_app.extensions.get('notification_provider')
+    if provider is None:
+        provider = LocalProvider() if os.getenv('NOTIFICATION_PROVIDER') == 'local' else LiveProvider()
+        current_app.extensions['notification_provider'] = provider
+    return provider
+
+
+def enqueue_email(recipient, subject, html):
+    """Queue an email on the current session; it is sent after the caller commits."""
+    message = NotificationOutbox(channel='email', recipient=recipient, subject=subject, body=html)
+    db.session.add(message)
+    return message
+
+
+def enqueue_whatsapp(phone, body, flier=None):
+    """Queue a WhatsApp message; the flier's Twilio media URL is resolved at send time."""
+    message = NotificationOutbox(channel='whatsapp', recipient=phone, body=body,
+                                 media_flier_hash=flier.sha256 if flier else None)
+    db.session.add(message)
+    return message
+
+
+def deliver(message, provider):
+    if message.channel == 'email':
+        return provider.send_email(message.recipient, message.subject, message.body)
+    flier = db.session.get(FlierImage, message.media_flier_hash) if message.media_flier_hash else None
+    return provider.send_whatsapp(message.recipient, message.body, flier)
+
+
+def drain_outbox(limit=BATCH_SIZE):
+    """Send due outbox messages, rescheduling failures with exponential backoff."""
+    provider = get_provider()
+    messages = claim_batch(NotificationOutbox, limit)
+    for message in messages:
+        try:
+            message.provider_id = deliver(message, provider)
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+            logger.info('Outbox %s %s sent to %s', message.channel, message.id, message.recipient)
+        except Exception as e:
+            if record_failure(message, e, MAX_ATTEMPTS):
+                logger.warning('Outbox %s %s failed permanently: %s', message.channel, message.id, e)
+            else:
+                logger.warning('Outbox %s %s attempt %s failed: %s', message.channel, message.id, message.attempts, e)
+        db.session.commit()
+    return len(messages)
@@ -0,0 +1,48 @@
+from flask import request
+from datetime import datetime, timedelta
+import base64
+import json
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+def parse_limit(default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Read ?limit= from the request, clamped to [1, maximum]."""
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(*values):
+    """Encode the sort key of the last row on a page as an opaque cursor."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor back into its list of values."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_date(value, end_of_day=False):
+    """Parse a YYYY-MM-DD or ISO-8601 query value.
+
+    With end_of_day, a bare date becomes midnight of the following day so it
+    can be used as an exclusive upper bound that still covers the whole day.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid date: {value}')
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
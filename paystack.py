@@ -0,0 +1,155 @@
+from metrics import track_call
+from dns_cache import CachedDNSAdapter, cache as dns_cache
+from urllib3.util.retry import Retry
+from threading import Lock
+from urllib.parse import urlsplit
+import requests
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv('PAYSTACK_POOL_SIZE', '10'))
+# (connect, read) seconds.
+TIMEOUT = (float(os.getenv('PAYSTACK_CONNECT_TIMEOUT', '3.05')), float(os.getenv('PAYSTACK_READ_TIMEOUT', '10')))
+# Consecutive failures that open the breaker, and how long it stays open before a trial call.
+FAILURE_THRESHOLD = int(os.getenv('PAYSTACK_BREAKER_FAILURES', '5'))
+RESET_TIMEOUT = float(os.getenv('PAYSTACK_BREAKER_RESET_SECONDS', '30'))
+
+
+class PaystackError(Exception):
+    pass
+
+
+class PaystackRejected(PaystackError):
+    """Paystack answered, but not with success (bad request, unknown reference, ...)."""
+
+    def __init__(self, status_code, data):
+        super().__init__(f'Paystack returned HTTP {status_code}: {data.get("message", "Unknown error")}')
+        self.status_code = status_code
+        self.data = data
+
+
+class PaystackUnavailable(PaystackError):
+    """Paystack could not be reached, returned a server error, or the breaker is open."""
+
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, then lets a single trial call through after a cool-down."""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.warning('Paystack circuit opened after %s consecutive failures', self.failures)
+                self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(FAILURE_THRESHOLD, RESET_TIMEOUT)
+_session = None
+_session_lock = Lock()
+
+
+def _build_session():
+    # Connection errors are retried for every method since the request never left;
+    # read errors and 5xx only for GET, because a repeated initialize is a new transaction.
+    retry = Retry(total=3, connect=2, read=2, status=2, backoff_factor=0.3, backoff_jitter=0.3,
+                  status_forcelist=(502, 503, 504), allowed_methods=frozenset({'GET'}),
+                  raise_on_status=False, respect_retry_after_header=True)
+    adapter = CachedDNSAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Shared keep-alive session; connections to Paystack are reused across requests and threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _base_url():
+    return os.getenv('PAYSTACK_BASE_URL', 'https://api.paystack.co')
+
+
+def precheck_dns():
+    """Background task: report Paystack lookup failures early.
+
+    Each process keeps its own cache entries fresh as it uses them; this only
+    refreshes the worker's copy and logs when resolution breaks.
+    """
+    host = urlsplit(_base_url()).hostname
+    try:
+        addresses = dns_cache.refresh(host)
+        logger.debug('Resolved %s to %s', host, ', '.join(addresses))
+    except OSError as e:
+        logger.warning('DNS pre-check for %s failed: %s', host, e)
+
+
+def _request(method, path, operation, **kwargs):
+    if not breaker.allow():
+        raise PaystackUnavailable('Paystack is temporarily unavailable (circuit open)')
+    url = f'{_base_url()}{path}'
+    headers = {'Authorization': f'Bearer {os.getenv("PAYSTACK_SECRET_KEY")}'}
+    try:
+        with track_call('paystack', operation):
+            response = get_session().request(method, url, headers=headers, timeout=TIMEOUT, **kwargs)
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        breaker.record_failure()
+        raise PaystackUnavailable(f'Network issue contacting Paystack: {str(e)}') from e
+    if response.status_code >= 500:
+        breaker.record_failure()
+        raise PaystackUnavailable(f'Paystack returned HTTP {response.status_code}')
+    breaker.record_success()
+    if response.status_code != 200 or not data.get('status', True):
+        raise PaystackRejected(response.status_code, data)
+    return data
+
+
+def initialize_transaction(payload):
+    """Start a checkout; returns Paystack's response with data.authorization_url and data.reference."""
+    return _request('POST', '/transaction/initialize', 'initialize', json=payload)
+
+
+def verify_transaction(reference):
+    """Fetch a transaction; callers check data.status for 'success'."""
+    return _request('GET', f'/transaction/verify/{reference}', 'verify')
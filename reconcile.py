@@ -0,0 +1,130 @@
+from extensions import db
+from models import Payment
+from ticketing import issue_ticket
+from inventory import release_payment
+from metrics import RECONCILE_RUN, RECONCILE_OUTCOMES, RECONCILE_BACKLOG
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+import paystack
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A checkout still pending after STALE_AFTER is asked about at most once per RECHECK_AFTER.
+STALE_AFTER = timedelta(minutes=float(os.getenv('RECONCILE_AFTER_MINUTES', '30')))
+RECHECK_AFTER = timedelta(minutes=float(os.getenv('RECONCILE_RECHECK_MINUTES', '30')))
+BATCH_SIZE = int(os.getenv('RECONCILE_BATCH_SIZE', '50'))
+# Concurrent verify calls; keep well under PAYSTACK_POOL_SIZE so checkouts still get connections.
+CONCURRENCY = int(os.getenv('RECONCILE_CONCURRENCY', '4'))
+# Wall-clock limit for one run, so a slow Paystack cannot hold up the worker's other
+# tasks; payments not reached are left for the next run.
+TIME_BUDGET = float(os.getenv('RECONCILE_TIME_BUDGET_SECONDS', '20'))
+# Paystack statuses after which a transaction can no longer be paid.
+FINAL_FAILURES = ('failed', 'abandoned', 'reversed')
+
+_executor = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix='reconcile')
+
+
+def _due(now):
+    return Payment.query.filter(
+        Payment.status == 'pending',
+        Payment.created_at < now - STALE_AFTER,
+        or_(Payment.reconciled_at.is_(None), Payment.reconciled_at < now - RECHECK_AFTER))
+
+
+def _claim_batch(limit):
+    now = datetime.utcnow()
+    payments = _due(now) \
+        .order_by(Payment.created_at) \
+        .limit(limit) \
+        .with_for_update(skip_locked=True) \
+        .all()
+    for payment in payments:
+        payment.reconciled_at = now
+    db.session.commit()
+    return [(payment.id, payment.paystack_ref) for payment in payments]
+
+
+def _release(claimed):
+    Payment.query.filter(Payment.id.in_([payment_id for payment_id, _ in claimed])) \
+        .update({'reconciled_at': None}, synchronize_session=False)
+    db.session.commit()
+
+
+def _check(reference):
+    """Runs on the pool: only talks to Paystack, so no session is shared between threads."""
+    try:
+        return paystack.verify_transaction(reference)['data']['status'], None
+    except paystack.PaystackRejected as e:
+        return 'not_found' if e.status_code in (400, 404) else 'rejected', e
+    except paystack.PaystackError as e:
+        return 'unavailable', e
+
+
+def _apply(payment_id, reference, status, error):
+    if status == 'success':
+        _, created = issue_ticket(payment_id)
+        outcome = 'issued' if created else 'already_issued'
+    elif status in FINAL_FAILURES or status == 'not_found':
+        # Locked like issue_ticket, so a confirmation that lands meanwhile is never overwritten.
+        payment = Payment.query.filter_by(id=payment_id).with_for_update().populate_existing().one()
+        if payment.status != 'pending':
+            db.session.commit()
+            return 'skipped'
+        payment.status = 'failed'
+        release_payment(payment)
+        outcome = 'failed'
+    elif status == 'unavailable':
+        # Paystack is down or the breaker is open; try these again on the next run.
+        logger.warning('Could not reconcile payment %s: %s', reference, error)
+        db.session.get(Payment, payment_id).reconciled_at = None
+        db.session.commit()
+        return 'unavailable'
+    else:
+        if error:
+            logger.warning('Could not reconcile payment %s: %s', reference, error)
+        return 'still_pending'
+    db.session.commit()
+    logger.info('Reconciled payment %s: Paystack status %s, %s', reference, status, outcome)
+    return outcome
+
+
+def reconcile_payments(limit=BATCH_SIZE):
+    """Background task: verify stale pending payments with Paystack, then issue tickets or fail them.
+
+    Verify calls run CONCURRENCY at a time; results are applied one by one on
+    this thread until TIME_BUDGET runs out. Returns {outcome: count} for the batch.
+    """
+    started = time.perf_counter()
+    claimed = _claim_batch(limit)
+    outcomes = {}
+    if claimed:
+        results = _executor.map(_check, [reference for _, reference in claimed], timeout=TIME_BUDGET)
+        applied = 0
+        try:
+            for (payment_id, reference), (status, error) in zip(claimed, results):
+                try:
+                    outcome = _apply(payment_id, reference, status, error)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.exception('Reconciling payment %s failed: %s', reference, e)
+                    outcome = 'error'
+                applied += 1
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                RECONCILE_OUTCOMES.inc(outcome=outcome)
+        except concurrent.futures.TimeoutError:
+            deferred = claimed[applied:]
+            _release(deferred)
+            logger.warning('Reconcile time budget of %ss used up; %s payment(s) left for the next run',
+                           TIME_BUDGET, len(deferred))
+            outcomes['deferred'] = len(deferred)
+            RECONCILE_OUTCOMES.inc(len(deferred), outcome='deferred')
+        elapsed = time.perf_counter() - started
+        logger.info('Reconciled %s payment(s) in %.2fs', len(claimed), elapsed, extra={'outcomes': outcomes})
+    RECONCILE_BACKLOG.set(_due(datetime.utcnow()).count())
+    RECONCILE_RUN.observe(time.perf_counter() - started)
+    return outcomes
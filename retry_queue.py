@@ -0,0 +1,50 @@
+from extensions import db
+from datetime import datetime, timedelta
+import random
+
+# Shared by the tables the worker drains with retries (notification outbox,
+# Paystack events). Their models have the columns status ('pending' until done),
+# attempts, next_attempt_at and last_error.
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 15 * 60
+# A claimed row becomes due again after this long if its worker dies mid-way.
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def backoff(attempts):
+    """Exponential delay before retry number attempts + 1, with jitter so failures don't retry in lockstep."""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(model, limit):
+    """Lease up to limit due pending rows of model to this worker and commit.
+
+    Each claimed row counts an attempt and is pushed CLAIM_LEASE into the future,
+    so other workers skip it until it is finished or the lease runs out.
+    """
+    now = datetime.utcnow()
+    rows = model.query \
+        .filter(model.status == 'pending', model.next_attempt_at <= now) \
+        .order_by(model.next_attempt_at) \
+        .limit(limit) \
+        .with_for_update(skip_locked=True) \
+        .all()
+    for row in rows:
+        row.attempts += 1
+        row.next_attempt_at = now + CLAIM_LEASE
+    db.session.commit()
+    return rows
+
+
+def record_failure(row, error, max_attempts):
+    """Note a failed attempt on a claimed row: retry with backoff, or mark it failed once out of attempts.
+
+    Returns True if the row failed permanently. The caller commits.
+    """
+    row.last_error = str(error)[:1000]
+    if row.attempts >= max_attempts:
+        row.status = 'failed'
+        return True
+    row.next_attempt_at = datetime.utcnow() + backoff(row.attempts)
+    return False
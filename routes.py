@@ -1,69 +1,32 @@
-from flask import Blueprint, request, redirect, jsonify, current_app, send_file
+from flask import Blueprint, request, redirect, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from extensions import db
-from models import User, Payment, Ticket, Movie, Setting
-from sendgrid.helpers.mail import Mail, To
-import requests
+from models import User, Payment, Ticket, Movie, Setting, FlierImage, BulkJob, BulkJobRecipient, MovieInventory, SeatHold
+from messages import ticket_whatsapp, reminder_whatsapp, ticket_email_batch, reminder_email_batch
+import campaigns
+from auth import admin_required, forget_user
+import paystack
+import webhooks
+from ticketing import create_ticket, issue_ticket, issue_vip_tickets
+from tokens import validate_token, ACCEPT_LEGACY_TOKENS
+from catalogue import get_cache, catalogue_etag, bump_catalogue_version, VERSION_KEY as CATALOGUE_VERSION_KEY
+from settings import get_setting, set_setting, invalidate_settings, VERSION_KEY as SETTINGS_VERSION_KEY
+from inventory import SoldOut, reserve_vip, allocate_vip, release_payment, release_vip
+import exports
+from pagination import parse_limit, parse_date, encode_cursor, decode_cursor
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import selectinload
+from images import store_flier_renditions, flier_url, rendition_urls, get_rendition, email_image_url, send_flier
+from werkzeug.exceptions import HTTPException
 import os
+import json
 from datetime import datetime
-import base64
-from PIL import Image
-import io
-import tempfile
-import secrets
+from PIL import UnidentifiedImageError
 import re
-import dns.resolver
+import logging
 
 api_blueprint = Blueprint('api', __name__)
-print("DEBUG: Loading routes.py with blueprint v1")
-
-resolver = dns.resolver.Resolver()
-resolver.nameservers = ['8.8.8.8', '8.8.4.4']
-
-def compress_image(image_data, max_size=(300, 300), quality=100):
-    """Compress image to JPEG with specified max size and quality."""
-    try:
-        img = Image.open(io.BytesIO(image_data))
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        output = io.BytesIO()
-        img.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True)
-        return output.getvalue()
-    except Exception as e:
-        print(f"DEBUG: Image compression error: {str(e)}")
-        return image_data
-
-def upload_image_to_twilio(image_data, twilio_client):
-    """Upload image to Twilio Content API and return media URL."""
-    try:
-        if len(image_data) > 5 * 1024 * 1024:
-            print("DEBUG: Image exceeds size limit")
-            return None
-        img = Image.open(io.BytesIO(image_data))
-        if img.format.lower() not in ['jpeg', 'png']:
-            print("DEBUG: Unsupported image format")
-            return None
-        url = 'https://content.twilio.com/v1/Content'
-        headers = {
-            'Authorization': f'Basic {base64.b64encode(f"{os.getenv("TWILIO_ACCOUNT_SID")}:{os.getenv("TWILIO_AUTH_TOKEN")}".encode()).decode()}',
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            'ContentType': 'image/jpeg',
-            'FriendlyName': 'Movie Flier',
-            'Content': base64.b64encode(image_data).decode('utf-8')
-        }
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response_data = response.json()
-        if response.status_code == 201:
-            content_sid = response_data['sid']
-            print(f"DEBUG: Image uploaded to Twilio, Content SID: {content_sid}")
-            return f"https://content.twilio.com/v1/Content/{content_sid}"
-        else:
-            print(f"DEBUG: Failed to upload image to Twilio: {response_data}")
-            return None
-    except Exception as e:
-        print(f"DEBUG: Error uploading image to Twilio: {str(e)}")
-        return None
+logger = logging.getLogger(__name__)
 
 def is_valid_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -73,85 +36,14 @@ def is_valid_phone(phone):
     pattern = r'^\+?\d{10,15}$'
     return bool(re.match(pattern, phone.strip()))
 
-def get_email_template(user_email, event_title, ticket_type_label, ticket_token, movie, flier_data_uri):
-    """Generate styled email template for ticket confirmation."""
-    return f"""
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; color: #333; line-height: 1.6; background-color: #f4f4f4; padding: 20px; }}
-            .container {{ max-width: 600px; margin: 0 auto; background: #fff; padding: 20px; border-radius: 8px; box-shadow: 0 0 10px rgba(0,0,0,0.1); }}
-            h1 {{ color: #d32f2f; text-align: center; }}
-            h3 {{ color: #333; }}
-            p {{ margin: 10px 0; }}
-            .highlight {{ background: #ffebee; padding: 10px; border-radius: 4px; text-align: center; font-weight: bold; }}
-            .schedule {{ background: #e3f2fd; padding: 15px; border-radius: 4px; }}
-            .footer {{ text-align: center; margin-top: 20px; font-size: 12px; color: #777; }}
-            .image {{ max-width: 100%; height: auto; margin-top: 20px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>{event_title} Premiere</h1>
-            <p>Dear {user_email},</p>
-            <p>Thank you for securing your <strong>{ticket_type_label}</strong> ticket to the highly anticipated premiere of <strong>{event_title}</strong>!</p>
-            <div class="highlight">
-                🎟 <strong>Access Code:</strong> {ticket_token}
-            </div>
-            <h3>Event Details</h3>
-            <p><strong>Date:</strong> 22nd November 2025</p>
-            <p><strong>Time:</strong> 6:00 PM</p>
-            <p><strong>Venue:</strong> Ozene Cinema, Yaba</p>
-            <p><strong>Premiere Colour Code:</strong> 🖤 Black and Deep Berry Wine</p>
-            <h3>Evening Schedule</h3>
-            <div class="schedule">
-                <p>🕕 6:00 PM – Red Carpet Arrival & Check-in</p>
-                <p>🕕 6:00–6:30 PM – Meet & Greet Session</p>
-                <p>🕖 7:00 PM – Showtime Begins</p>
-                <p>🕘 9:00 PM – Closing Moments & Curtain Call</p>
-            </div>
-            <p>🍹 Enjoy complimentary refreshments and photo opportunities with the cast!</p>
-            <p>We’re thrilled to share this cinematic experience with you. Get ready for a night of excitement, connection, and cinematic brilliance!</p>
-            {f'<img src="{flier_data_uri}" alt="Movie Flier" class="image">' if flier_data_uri else ''}
-            <p class="footer">Warm regards,<br>The {event_title} Premiere Team<br>Lights. Camera. Connection. Let the story begin! 🎥</p>
-        </div>
-    </body>
-    </html>
-    """
-
-def get_whatsapp_template(user_phone, event_title, ticket_type_label, ticket_token, movie):
-    """Generate formatted WhatsApp template for ticket confirmation."""
-    return f"""
-🎥 *{event_title} Premiere*
-
-Dear {user_phone},
-
-Thank you for securing your *{ticket_type_label}* ticket to the premiere of *{event_title}*!
-
-🎟 *Access Code*: {ticket_token}
-📅 *Date*: 22nd November 2025
-🕕 *Time*: 6:00 PM
-📍 *Venue*: Ozene Cinema, Yaba
-🎨 *Colour Code*: Black and Deep Berry Wine
-
-*Evening Schedule*:
-🕕 6:00 PM – Red Carpet Arrival & Check-in
-🕕 6:00–6:30 PM – Meet & Greet Session
-🕖 7:00 PM – Showtime Begins
-🕘 9:00 PM – Closing Moments & Curtain Call
-
-🍹 Complimentary refreshments and photo opportunities with the cast await you!
-
-We’re thrilled to share this cinematic experience with you.
-
-*Lights. Camera. Connection. Let the story begin!* 🎥
-Warm regards,
-The {event_title} Premiere Team
-"""
+def release_hold(hold):
+    """Give back a VIP hold whose checkout never reached Paystack."""
+    if hold:
+        db.session.delete(hold)
+        db.session.commit()
 
 @api_blueprint.route('/register', methods=['POST'])
 def register():
-    print("DEBUG: /api/register endpoint called")
     try:
         data = request.json
         if not all(key in data for key in ['email', 'phone', 'password']):
@@ -171,7 +63,6 @@ def register():
 
 @api_blueprint.route('/login', methods=['POST'])
 def login():
-    print("DEBUG: /api/login endpoint called")
     try:
         data = request.json
         user = User.query.filter_by(email=data['email']).first()
@@ -184,48 +75,57 @@ def login():
 
 @api_blueprint.route('/movies', methods=['GET'])
 def get_movies():
-    print("DEBUG: /api/movies endpoint called")
     try:
-        movies = Movie.query.all()
-        vip_price = float(Setting.query.filter_by(key='vip_price').first().value)
-        return jsonify([{
-            'id': m.id,
-            'title': m.title,
-            'premiere_date': str(m.premiere_date),
-            'flier_image': base64.b64encode(m.flier_image).decode('utf-8') if m.flier_image else None,
-            'regular_price': str(m.price),
-            'vip_price': str(vip_price)
-        } for m in movies])
+        etag = catalogue_etag(request.host_url)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            cache = get_cache()
+            body = cache.get(etag)
+            if body is None:
+                movies = Movie.query.all()
+                vip_price = get_setting('vip_price')
+                fliers = rendition_urls(movies)
+                body = json.dumps([{
+                    'id': m.id,
+                    'title': m.title,
+                    'premiere_date': str(m.premiere_date),
+                    'flier_url': flier_url(m),
+                    'fliers': fliers[m.id],
+                    'regular_price': str(m.price),
+                    'vip_price': str(vip_price)
+                } for m in movies]).encode()
+                cache.set(etag, body)
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/movies', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_admin_movies():
-    print("DEBUG: /api/admin/movies endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         movies = Movie.query.all()
-        vip_price = float(Setting.query.filter_by(key='vip_price').first().value)
+        vip_price = get_setting('vip_price')
+        fliers = rendition_urls(movies)
         return jsonify([{
             'id': m.id,
             'title': m.title,
             'premiere_date': str(m.premiere_date),
-            'flier_image': base64.b64encode(m.flier_image).decode('utf-8') if m.flier_image else None,
+            'flier_url': flier_url(m),
+            'fliers': fliers[m.id],
             'regular_price': str(m.price),
             'vip_price': str(vip_price)
         } for m in movies])
     except Exception as e:
-        print(f"DEBUG: Error in /api/admin/movies GET: {str(e)}")
+        logger.exception('Error in /api/admin/movies GET: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/verify-token', methods=['GET'])
 @jwt_required()
 def verify_token_endpoint():
-    print("DEBUG: /api/verify-token endpoint called")
     try:
         user_id = get_jwt_identity()
         user = User.query.get(int(user_id))
@@ -238,40 +138,45 @@ def verify_token_endpoint():
             }
         }), 200
     except Exception as e:
-        print(f"DEBUG: Error in /api/verify-token: {str(e)}")
+        logger.exception('Error in /api/verify-token: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 401
 
 @api_blueprint.route('/image/<int:movie_id>', methods=['GET'])
 def get_movie_image(movie_id):
-    print("DEBUG: /api/image endpoint called")
     try:
         movie = Movie.query.get(movie_id)
-        if not movie or not movie.flier_image:
+        if not movie or not movie.flier:
             return jsonify({'message': 'Image not found'}), 404
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            temp_file.write(movie.flier_image)
-            temp_file_path = temp_file.name
-        return send_file(temp_file_path, mimetype='image/jpeg')
+        # The movie -> flier mapping can change, so revalidate daily via the digest ETag.
+        return send_flier(movie.flier, max_age=24 * 3600, immutable=False)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
+@api_blueprint.route('/fliers/<digest>', methods=['GET'])
+def get_flier(digest):
+    try:
+        flier = db.session.get(FlierImage, digest)
+        if not flier:
+            return jsonify({'message': 'Image not found'}), 404
+        return send_flier(flier)
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/movies/v1', methods=['POST'])
-@jwt_required()
+@admin_required
 def add_movie():
-    print("DEBUG: /api/admin/movies/v1 endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        print(f"DEBUG: Identity: {user_id}, is_admin: {user.is_admin}")
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
 
         if 'title' not in request.form or 'premiere_date' not in request.form or 'flier_image' not in request.files:
             return jsonify({'message': 'Missing required fields: title, premiere_date, flier_image'}), 400
 
         title = request.form['title']
         premiere_date_str = request.form['premiere_date']
-        price = request.form.get('price', Setting.query.filter_by(key='regular_price').first().value)
+        price = request.form.get('price', get_setting('regular_price'))
         price = float(price)
 
         try:
@@ -291,126 +196,162 @@ def add_movie():
         if len(image_data) > 5 * 1024 * 1024:
             return jsonify({'message': 'File too large. Max 5MB'}), 400
 
-        compressed_image = compress_image(image_data)
+        try:
+            flier = store_flier_renditions(image_data)
+        except UnidentifiedImageError:
+            return jsonify({'message': 'Invalid image file'}), 400
 
-        movie = Movie(title=title, premiere_date=premiere_date, flier_image=compressed_image, price=price)
+        movie = Movie(title=title, premiere_date=premiere_date, flier_hash=flier.sha256, price=price)
         db.session.add(movie)
+        bump_catalogue_version()
         db.session.commit()
-        print("DEBUG: Movie added successfully v1")
+        invalidate_settings()
+        logger.info('Movie %s added', movie.id)
         return jsonify({'message': 'Movie added'}), 201
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/admin/movies/v1: {str(e)}")
+        logger.exception('Error in /api/admin/movies/v1: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/movies/<int:movie_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_movie(movie_id):
-    print(f"DEBUG: /api/admin/movies/{movie_id} DELETE endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        print(f"DEBUG: Identity: {user_id}, is_admin: {user.is_admin}")
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         movie = Movie.query.get(movie_id)
         if not movie:
             return jsonify({'message': 'Movie not found'}), 404
+        SeatHold.query.filter_by(movie_id=movie_id).delete()
+        MovieInventory.query.filter_by(movie_id=movie_id).delete()
         Ticket.query.filter_by(movie_id=movie_id).delete()
         Payment.query.filter_by(movie_id=movie_id).delete()
+        BulkJobRecipient.query.filter(BulkJobRecipient.job_id.in_(
+            db.session.query(BulkJob.id).filter_by(movie_id=movie_id))).delete(synchronize_session=False)
+        BulkJob.query.filter_by(movie_id=movie_id).delete()
         db.session.delete(movie)
+        bump_catalogue_version()
         db.session.commit()
-        print(f"DEBUG: Movie {movie_id} deleted successfully")
+        invalidate_settings()
+        logger.info('Movie %s deleted successfully', movie_id)
         return jsonify({'message': 'Movie deleted'}), 200
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/admin/movies/{movie_id} DELETE: {str(e)}")
+        logger.exception('Error in /api/admin/movies/%s DELETE: %s', movie_id, e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/users/<int:user_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_user(user_id):
-    print(f"DEBUG: /api/admin/users/{user_id} DELETE endpoint called")
     try:
-        admin_id = get_jwt_identity()
-        admin = User.query.get(int(admin_id))
-        print(f"DEBUG: Identity: {admin_id}, is_admin: {admin.is_admin}")
-        if not admin.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
-        if int(admin_id) == user_id:
+        if int(get_jwt_identity()) == user_id:
             return jsonify({'message': 'Cannot delete own account'}), 403
         user = User.query.get(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
-        Payment.query.filter_by(user_id=user_id).delete()
+        vip_counts = db.session.query(Ticket.movie_id, db.func.count(Ticket.id)) \
+            .filter_by(user_id=user_id, ticket_type='vip').group_by(Ticket.movie_id).all()
+        for vip_movie_id, count in vip_counts:
+            release_vip(vip_movie_id, count)
+        SeatHold.query.filter(SeatHold.payment_id.in_(
+            db.session.query(Payment.id).filter_by(user_id=user_id))).delete(synchronize_session=False)
         Ticket.query.filter_by(user_id=user_id).delete()
+        Payment.query.filter_by(user_id=user_id).delete()
+        # Keep the campaign history; it just no longer names who started it.
+        BulkJob.query.filter_by(created_by=user_id).update({'created_by': None})
         db.session.delete(user)
         db.session.commit()
-        print(f"DEBUG: User {user_id} deleted successfully")
+        forget_user(user_id)
+        logger.info('User %s deleted successfully', user_id)
         return jsonify({'message': 'User deleted'}), 200
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/admin/users/{user_id} DELETE: {str(e)}")
+        logger.exception('Error in /api/admin/users/%s DELETE: %s', user_id, e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/tickets/<int:ticket_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_ticket(ticket_id):
-    print(f"DEBUG: /api/admin/tickets/{ticket_id} DELETE endpoint called")
     try:
-        admin_id = get_jwt_identity()
-        admin = User.query.get(int(admin_id))
-        print(f"DEBUG: Identity: {admin_id}, is_admin: {admin.is_admin}")
-        if not admin.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         ticket = Ticket.query.get(ticket_id)
         if not ticket:
             return jsonify({'message': 'Ticket not found'}), 404
+        if ticket.ticket_type == 'vip':
+            release_vip(ticket.movie_id)
         db.session.delete(ticket)
         db.session.commit()
-        print(f"DEBUG: Ticket {ticket_id} deleted successfully")
+        logger.info('Ticket %s deleted successfully', ticket_id)
         return jsonify({'message': 'Ticket deleted'}), 200
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/admin/tickets/{ticket_id} DELETE: {str(e)}")
+        logger.exception('Error in /api/admin/tickets/%s DELETE: %s', ticket_id, e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/tickets', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_tickets():
-    print("DEBUG: /api/admin/tickets GET endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
-        tickets = Ticket.query.all()
-        return jsonify([{
-            'id': ticket.id,
-            'user_id': ticket.user_id,
-            'movie_id': ticket.movie_id,
-            'payment_id': ticket.payment_id,
-            'token': ticket.token,
-            'ticket_type': ticket.ticket_type,
-            'created_at': str(ticket.created_at)
-        } for ticket in tickets]), 200
+        try:
+            limit = parse_limit()
+            movie_id = request.args.get('movie_id', type=int)
+            ticket_type = request.args.get('ticket_type')
+            created_from = parse_date(request.args.get('from'))
+            created_to = parse_date(request.args.get('to'), end_of_day=True)
+            cursor = request.args.get('cursor')
+            after = None
+            if cursor:
+                after_created_at, after_id = decode_cursor(cursor)
+                after = (datetime.fromisoformat(after_created_at), int(after_id))
+        except (TypeError, ValueError) as e:
+            return jsonify({'message': str(e) or 'Invalid cursor'}), 400
+
+        query = Ticket.query
+        if movie_id is not None:
+            query = query.filter(Ticket.movie_id == movie_id)
+        if ticket_type:
+            query = query.filter(Ticket.ticket_type == ticket_type)
+        if created_from:
+            query = query.filter(Ticket.created_at >= created_from)
+        if created_to:
+            query = query.filter(Ticket.created_at < created_to)
+        if after:
+            query = query.filter(tuple_(Ticket.created_at, Ticket.id) > after)
+        tickets = query.order_by(Ticket.created_at, Ticket.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(tickets) > limit:
+            tickets = tickets[:limit]
+            next_cursor = encode_cursor(tickets[-1].created_at, tickets[-1].id)
+
+        return jsonify({
+            'tickets': [{
+                'id': ticket.id,
+                'user_id': ticket.user_id,
+                'movie_id': ticket.movie_id,
+                'payment_id': ticket.payment_id,
+                'token': ticket.token,
+                'ticket_type': ticket.ticket_type,
+                'created_at': str(ticket.created_at)
+            } for ticket in tickets],
+            'next_cursor': next_cursor
+        }), 200
     except Exception as e:
-        print(f"DEBUG: Error in /api/admin/tickets GET: {str(e)}")
+        logger.exception('Error in /api/admin/tickets GET: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/verify-token', methods=['POST'])
-@jwt_required()
+@admin_required
 def verify_token():
-    print("DEBUG: /api/admin/verify-token endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         data = request.json
         if 'token' not in data:
             return jsonify({'message': 'Missing token'}), 400
-        ticket = Ticket.query.filter_by(token=data['token']).first()
+        token = validate_token(data['token'])
+        candidates = {token} if token else set()
+        if ACCEPT_LEGACY_TOKENS and isinstance(data['token'], str):
+            # Legacy random tokens carry no check digit; look them up as typed.
+            candidates.add(data['token'].strip().upper())
+        if not candidates:
+            return jsonify({'message': 'Invalid token'}), 400
+        ticket = Ticket.query.filter(Ticket.token.in_(candidates)).first()
         if not ticket:
             return jsonify({'message': 'Invalid token'}), 404
         ticket_user = User.query.get(ticket.user_id)
@@ -428,24 +369,47 @@ def verify_token():
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/users', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_users():
-    print("DEBUG: /api/admin/users endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
-        users = User.query.all()
-        result = []
-        for user in users:
-            payments = Payment.query.filter_by(user_id=user.id).all()
-            tickets = Ticket.query.filter_by(user_id=user.id).all()
-            user_data = {
-                'id': user.id,
-                'email': user.email,
-                'phone': user.phone,
-                'is_admin': user.is_admin,
+        try:
+            limit = parse_limit()
+            movie_id = request.args.get('movie_id', type=int)
+            payment_status = request.args.get('payment_status')
+            created_from = parse_date(request.args.get('from'))
+            created_to = parse_date(request.args.get('to'), end_of_day=True)
+            cursor = request.args.get('cursor')
+            after_id = int(decode_cursor(cursor)[0]) if cursor else None
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        query = User.query.options(selectinload(User.payments), selectinload(User.tickets))
+        if movie_id is not None:
+            query = query.filter(or_(
+                User.payments.any(Payment.movie_id == movie_id),
+                User.tickets.any(Ticket.movie_id == movie_id)
+            ))
+        if payment_status:
+            query = query.filter(User.payments.any(Payment.status == payment_status))
+        if created_from:
+            query = query.filter(User.created_at >= created_from)
+        if created_to:
+            query = query.filter(User.created_at < created_to)
+        if after_id is not None:
+            query = query.filter(User.id > after_id)
+        users = query.order_by(User.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1].id)
+
+        return jsonify({
+            'users': [{
+                'id': u.id,
+                'email': u.email,
+                'phone': u.phone,
+                'is_admin': u.is_admin,
                 'payments': [{
                     'id': p.id,
                     'movie_id': p.movie_id,
@@ -454,69 +418,95 @@ def get_users():
                     'paystack_ref': p.paystack_ref,
                     'ticket_type': p.ticket_type,
                     'created_at': str(p.created_at)
-                } for p in payments],
+                } for p in u.payments],
                 'tickets': [{
                     'id': t.id,
                     'movie_id': t.movie_id,
                     'token': t.token,
                     'ticket_type': t.ticket_type,
                     'created_at': str(t.created_at)
-                } for t in tickets]
-            }
-            result.append(user_data)
-        return jsonify(result)
+                } for t in u.tickets]
+            } for u in users],
+            'next_cursor': next_cursor
+        })
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
+@api_blueprint.route('/admin/export/<dataset>', methods=['GET'])
+@admin_required
+def export_dataset(dataset):
+    try:
+        if dataset not in exports.DATASETS:
+            return jsonify({'message': f'Unknown dataset: must be one of {", ".join(exports.DATASETS)}'}), 404
+        fmt = request.args.get('format', 'csv')
+        if fmt not in exports.FORMATS:
+            return jsonify({'message': 'Invalid format: must be csv or ndjson'}), 400
+        try:
+            query = exports.build_export_query(
+                dataset,
+                include=[part.strip() for part in request.args.get('include', '').split(',') if part.strip()],
+                movie_id=request.args.get('movie_id', type=int),
+                created_from=parse_date(request.args.get('from')),
+                created_to=parse_date(request.args.get('to'), end_of_day=True),
+                ticket_type=request.args.get('ticket_type'),
+                status=request.args.get('status')
+            )
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        filename = f"{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+        return Response(
+            stream_with_context(exports.stream_export(query, fmt)),
+            mimetype=exports.FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        logger.exception('Error in /api/admin/export/%s: %s', dataset, e)
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
 @api_blueprint.route('/payments/initialize', methods=['POST'])
 @jwt_required()
 def initialize_payment():
-    print("DEBUG: /api/payments/initialize endpoint called")
     try:
         user_id = get_jwt_identity()
         data = request.json
-        print(f"DEBUG: Request data: {data}")
         if not data or 'movie_id' not in data or 'email' not in data or 'ticket_type' not in data:
             missing_fields = []
             if not data.get('movie_id'): missing_fields.append('movie_id')
             if not data.get('email'): missing_fields.append('email')
             if not data.get('ticket_type'): missing_fields.append('ticket_type')
-            print(f"DEBUG: Missing required fields: {', '.join(missing_fields)}")
+            logger.info('Missing required fields: %s', ', '.join(missing_fields))
             return jsonify({'message': f'Missing required fields: {", ".join(missing_fields)}'}), 400
         movie_id = int(data['movie_id'])
         email = data['email']
         ticket_type = data['ticket_type']
         if ticket_type not in ['regular', 'vip']:
-            print(f"DEBUG: Invalid ticket_type: {ticket_type}")
+            logger.info('Invalid ticket_type: %s', ticket_type)
             return jsonify({'message': 'Invalid ticket_type: must be regular or vip'}), 400
         user = User.query.get(int(user_id))
-        print(f"DEBUG: User ID: {user_id}, Email: {user.email}, Provided Email: {email}")
         if user.email != email:
-            print("DEBUG: Email does not match user")
+            logger.info('Email does not match user')
             return jsonify({'message': 'Invalid email'}), 403
         movie = Movie.query.get(movie_id)
         if not movie:
-            print(f"DEBUG: Movie not found for movie_id: {movie_id}")
+            logger.info('Movie not found for movie_id: %s', movie_id)
             return jsonify({'message': 'Movie not found'}), 404
 
+        hold = None
         if ticket_type == 'vip':
-            vip_setting = Setting.query.filter_by(key='vip_price').first()
-            if not vip_setting:
-                print("DEBUG: vip_price setting not found")
+            amount = get_setting('vip_price')
+            if amount is None:
+                logger.warning('vip_price setting not found')
                 return jsonify({'message': 'VIP price not configured'}), 500
-            vip_limit = int(Setting.query.filter_by(key='vip_limit').first().value)
-            vip_count = Payment.query.filter_by(movie_id=movie_id, ticket_type='vip', status='success').count()
-            if vip_count >= vip_limit:
-                print(f"DEBUG: VIP limit reached: {vip_count}/{vip_limit}")
+            try:
+                hold = reserve_vip(movie_id)
+            except SoldOut as e:
+                db.session.rollback()
+                logger.info('%s', e)
                 return jsonify({'message': 'VIP tickets sold out'}), 400
-            amount = float(vip_setting.value)
+            db.session.commit()
         else:
             amount = float(movie.price)
 
-        headers = {
-            'Authorization': f'Bearer {os.getenv("PAYSTACK_SECRET_KEY")}',
-            'Content-Type': 'application/json'
-        }
         frontend_url = os.getenv('FRONTEND_URL', 'https://ohamsmovies.com.ng')
         callback_url = f"{frontend_url}/payment-callback"
         webhook_url = f"{os.getenv('BACKEND_URL', request.host_url.rstrip('/'))}/api/payment-webhook"
@@ -526,30 +516,17 @@ def initialize_payment():
             'callback_url': callback_url,
             'metadata': {'movie_id': movie_id, 'user_id': user.id, 'ticket_type': ticket_type, 'webhook_url': webhook_url}
         }
-        print(f"DEBUG: Paystack payload: {payload}")
 
         try:
-            resolved_ip = resolver.resolve('api.paystack.co', 'A')
-            print(f"DEBUG: Resolved api.paystack.co to {resolved_ip[0].to_text()}")
-        except Exception as dns_error:
-            print(f"DEBUG: DNS resolution failed: {str(dns_error)}")
-            return jsonify({'message': f'Error: DNS resolution failed for Paystack API: {str(dns_error)}'}), 500
-
-        try:
-            response = requests.post(
-                f'{os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")}/transaction/initialize',
-                json=payload,
-                headers=headers,
-                timeout=15
-            )
-            response_data = response.json()
-            print(f"DEBUG: Paystack response: {response_data}")
-            if response.status_code != 200:
-                print(f"DEBUG: Paystack error: {response_data}")
-                return jsonify({'message': 'Payment initialization failed', 'error': response_data}), 400
-        except requests.exceptions.RequestException as e:
-            print(f"DEBUG: Network error calling Paystack API: {str(e)}")
-            return jsonify({'message': f'Error: Network issue contacting Paystack: {str(e)}'}), 500
+            response_data = paystack.initialize_transaction(payload)
+        except paystack.PaystackRejected as e:
+            logger.warning('Paystack initialize failed: %s', e)
+            release_hold(hold)
+            return jsonify({'message': 'Payment initialization failed', 'error': e.data}), 400
+        except paystack.PaystackUnavailable as e:
+            logger.warning('Paystack initialize unavailable: %s', e)
+            release_hold(hold)
+            return jsonify({'message': f'Error: {str(e)}'}), 503
 
         payment = Payment(
             user_id=user.id,
@@ -560,327 +537,126 @@ def initialize_payment():
             ticket_type=ticket_type
         )
         db.session.add(payment)
+        if hold:
+            db.session.flush()
+            hold.payment_id = payment.id
         db.session.commit()
-        print(f"DEBUG: Payment created with reference: {response_data['data']['reference']}")
+        logger.info('Payment created with reference: %s', response_data['data']['reference'])
         return jsonify({
             'authorization_url': response_data['data']['authorization_url'],
             'reference': response_data['data']['reference']
         })
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/payments/initialize: {str(e)}")
+        logger.exception('Error in /api/payments/initialize: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/payment-callback', methods=['GET'])
 def payment_callback():
-    print("DEBUG: /api/payment-callback endpoint called")
     try:
         reference = request.args.get('reference') or request.args.get('trxref')
         if not reference:
-            print("DEBUG: No reference provided in callback")
+            logger.debug('No reference provided in callback')
             return jsonify({'message': 'Missing reference'}), 400
 
         payment = Payment.query.filter_by(paystack_ref=reference).first()
         if not payment:
-            print(f"DEBUG: Payment not found for reference: {reference}")
+            logger.warning('Payment not found for reference: %s', reference)
             return jsonify({'message': 'Payment not found'}), 404
 
-        headers = {'Authorization': f'Bearer {os.getenv("PAYSTACK_SECRET_KEY")}'}
         try:
-            response = requests.get(
-                f'{os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")}/transaction/verify/{reference}',
-                headers=headers,
-                timeout=15
-            )
-            response_data = response.json()
-            print(f"DEBUG: Paystack verify response: {response_data}")
-            if response.status_code != 200 or response_data['data']['status'] != 'success':
-                print(f"DEBUG: Payment verification failed: {response_data}")
-                return jsonify({'message': 'Payment verification failed', 'error': response_data}), 400
-        except requests.exceptions.RequestException as e:
-            print(f"DEBUG: Network error verifying payment: {str(e)}")
-            return jsonify({'message': f'Error verifying payment: {str(e)}'}), 500
-
-        if payment.status != 'success':
-            payment.status = 'success'
-            ticket_token = Ticket.generate_token()
-            ticket = Ticket(
-                user_id=payment.user_id,
-                movie_id=payment.movie_id,
-                payment_id=payment.id,
-                token=ticket_token,
-                ticket_type=payment.ticket_type
-            )
-            db.session.add(ticket)
-            db.session.commit()
-            print(f"DEBUG: Ticket created for payment {reference}, token: {ticket_token}")
-
-            movie = Movie.query.get(payment.movie_id)
-            user = User.query.get(payment.user_id)
-
-            event_title = movie.title
-            ticket_type_label = 'VIP' if payment.ticket_type == 'vip' else 'Regular'
-            flier_data_uri = f"data:image/jpeg;base64,{base64.b64encode(movie.flier_image).decode('utf-8')}" if movie.flier_image else ""
-
-            email_message = get_email_template(user.email, event_title, ticket_type_label, ticket_token, movie, flier_data_uri)
-
-            try:
-                sendgrid_client = current_app.config['SENDGRID_CLIENT']
-                if sendgrid_client:
-                    message = Mail(
-                        from_email=current_app.config['FROM_EMAIL'],
-                        to_emails=user.email,
-                        subject=f'{ticket_type_label} Ticket for {event_title}',
-                        html_content=email_message
-                    )
-                    response = sendgrid_client.send(message)
-                    print(f"DEBUG: {ticket_type_label} Email sent to {user.email}, status: {response.status_code}")
-                else:
-                    print("DEBUG: SendGrid is disabled, skipping email")
-            except Exception as e:
-                print(f"DEBUG: SendGrid error for {user.email}: {str(e)}")
-
-            try:
-                twilio_client = current_app.config['TWILIO_CLIENT']
-                if twilio_client and user.phone:
-                    whatsapp_message = get_whatsapp_template(user.phone, event_title, ticket_type_label, ticket_token, movie)
-                    media_url = []
-                    if movie.flier_image:
-                        media_url = [upload_image_to_twilio(movie.flier_image, twilio_client)]
-                        media_url = [url for url in media_url if url]
-                    response = twilio_client.messages.create(
-                        from_=current_app.config['TWILIO_WHATSAPP_FROM'],
-                        body=whatsapp_message,
-                        media_url=media_url,
-                        to=f"whatsapp:{user.phone}"
-                    )
-                    print(f"DEBUG: {ticket_type_label} WhatsApp message sent to {user.phone}, SID: {response.sid}")
-                else:
-                    print(f"DEBUG: Twilio is disabled or no phone number for user {user.email}, skipping WhatsApp message")
-            except Exception as e:
-                print(f"DEBUG: Twilio error for {user.phone}: {str(e)}")
+            response_data = paystack.verify_transaction(reference)
+        except paystack.PaystackRejected as e:
+            logger.warning('Payment verification failed for %s: %s', reference, e)
+            return jsonify({'message': 'Payment verification failed', 'error': e.data}), 400
+        except paystack.PaystackUnavailable as e:
+            logger.warning('Paystack verify unavailable: %s', e)
+            return jsonify({'message': f'Error verifying payment: {str(e)}'}), 503
+        if response_data['data']['status'] != 'success':
+            logger.warning('Payment verification failed for %s: %s', reference, response_data['data']['status'])
+            return jsonify({'message': 'Payment verification failed', 'error': response_data}), 400
+
+        issue_ticket(payment.id)
+        db.session.commit()
 
         frontend_url = os.getenv("FRONTEND_URL", "https://ohamsmovies.com.ng")
         redirect_url = f"{frontend_url}/payment-callback?reference={reference}"
-        print(f"DEBUG: Payment callback processed, redirecting to: {redirect_url}")
+        logger.debug('Payment callback processed, redirecting to: %s', redirect_url)
         return redirect(redirect_url)
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/payment-callback: {str(e)}")
+        logger.exception('Error in /api/payment-callback: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/payment-webhook', methods=['POST'])
 def payment_webhook():
-    print("DEBUG: /api/payment-webhook endpoint called")
+    """Verify, store and acknowledge a Paystack event; the background worker applies it."""
     try:
-        event = request.json
-        print(f"DEBUG: Webhook event: {event}")
-        if not event or 'event' not in event or 'data' not in event:
-            print("DEBUG: Invalid webhook payload")
+        raw_body = request.get_data()
+        if not webhooks.verify_signature(raw_body, request.headers.get('x-paystack-signature')):
+            logger.warning('Rejected webhook with invalid signature from %s', request.remote_addr)
+            return jsonify({'message': 'Invalid signature'}), 401
+        try:
+            event = json.loads(raw_body)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict) or 'event' not in event or not isinstance(event.get('data'), dict):
+            logger.warning('Invalid webhook payload')
             return jsonify({'message': 'Invalid payload'}), 400
 
-        if event['event'] == 'charge.success':
-            reference = event['data']['reference']
-            payment = Payment.query.filter_by(paystack_ref=reference).first()
-            if not payment:
-                print(f"DEBUG: Payment not found for reference: {reference}")
-                return jsonify({'message': 'Payment not found'}), 404
-
-            if payment.status != 'success':
-                payment.status = 'success'
-                ticket_token = Ticket.generate_token()
-                ticket = Ticket(
-                    user_id=payment.user_id,
-                    movie_id=payment.movie_id,
-                    payment_id=payment.id,
-                    token=ticket_token,
-                    ticket_type=payment.ticket_type
-                )
-                db.session.add(ticket)
-                db.session.commit()
-                print(f"DEBUG: Ticket created for payment {reference}, token: {ticket_token}")
-
-                movie = Movie.query.get(payment.movie_id)
-                user = User.query.get(payment.user_id)
-
-                event_title = movie.title
-                ticket_type_label = 'VIP' if payment.ticket_type == 'vip' else 'Regular'
-                flier_data_uri = f"data:image/jpeg;base64,{base64.b64encode(movie.flier_image).decode('utf-8')}" if movie.flier_image else ""
-
-                email_message = get_email_template(user.email, event_title, ticket_type_label, ticket_token, movie, flier_data_uri)
-
-                try:
-                    sendgrid_client = current_app.config['SENDGRID_CLIENT']
-                    if sendgrid_client:
-                        message = Mail(
-                            from_email=current_app.config['FROM_EMAIL'],
-                            to_emails=user.email,
-                            subject=f'{ticket_type_label} Ticket for {event_title}',
-                            html_content=email_message
-                        )
-                        response = sendgrid_client.send(message)
-                        print(f"DEBUG: {ticket_type_label} Email sent to {user.email}, status: {response.status_code}")
-                    else:
-                        print("DEBUG: SendGrid is disabled, skipping email")
-                except Exception as e:
-                    print(f"DEBUG: SendGrid error for {user.email}: {str(e)}")
-
-                try:
-                    twilio_client = current_app.config['TWILIO_CLIENT']
-                    if twilio_client and user.phone:
-                        whatsapp_message = get_whatsapp_template(user.phone, event_title, ticket_type_label, ticket_token, movie)
-                        media_url = []
-                        if movie.flier_image:
-                            media_url = [upload_image_to_twilio(movie.flier_image, twilio_client)]
-                            media_url = [url for url in media_url if url]
-                        response = twilio_client.messages.create(
-                            from_=current_app.config['TWILIO_WHATSAPP_FROM'],
-                            body=whatsapp_message,
-                            media_url=media_url,
-                            to=f"whatsapp:{user.phone}"
-                        )
-                        print(f"DEBUG: {ticket_type_label} WhatsApp message sent to {user.phone}, SID: {response.sid}")
-                    else:
-                        print(f"DEBUG: Twilio is disabled or no phone number for user {user.email}, skipping WhatsApp message")
-                except Exception as e:
-                    print(f"DEBUG: Twilio error for {user.phone}: {str(e)}")
-
-            return jsonify({'message': 'Webhook processed'}), 200
-        else:
-            print(f"DEBUG: Unhandled webhook event: {event['event']}")
-            return jsonify({'message': 'Event not handled'}), 200
+        if not webhooks.record_event(event, raw_body):
+            return jsonify({'message': 'Duplicate event'}), 200
+        return jsonify({'message': 'Event received'}), 200
     except Exception as e:
-        print(f"DEBUG: Error in /api/payment-webhook: {str(e)}")
+        db.session.rollback()
+        logger.exception('Error in /api/payment-webhook: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/payments/verify/<reference>', methods=['GET'])
 def verify_payment(reference):
-    print(f"DEBUG: /api/payments/verify/{reference} endpoint called")
     try:
         user_id = None
         try:
             jwt = get_jwt()
             user_id = get_jwt_identity()
-            print(f"DEBUG: JWT provided, user_id: {user_id}")
+            logger.debug('JWT provided, user_id: %s', user_id)
         except:
-            print("DEBUG: No valid JWT provided, proceeding without authentication")
+            logger.debug('No valid JWT provided, proceeding without authentication')
 
         payment = Payment.query.filter_by(paystack_ref=reference).first()
         if not payment:
-            print(f"DEBUG: Payment not found for reference: {reference}")
+            logger.warning('Payment not found for reference: %s', reference)
             return jsonify({'message': 'Payment not found'}), 404
         if user_id and payment.user_id != int(user_id):
-            print(f"DEBUG: User ID mismatch: payment.user_id={payment.user_id}, jwt.user_id={user_id}")
+            logger.warning('User ID mismatch: payment.user_id=%s, jwt.user_id=%s', payment.user_id, user_id)
             return jsonify({'message': 'Unauthorized access to payment'}), 403
 
-        headers = {'Authorization': f'Bearer {os.getenv("PAYSTACK_SECRET_KEY")}'}
         try:
-            response = requests.get(
-                f'{os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")}/transaction/verify/{reference}',
-                headers=headers,
-                timeout=15
-            )
-            response_data = response.json()
-            print(f"DEBUG: Paystack verify response: Status={response.status_code}, Data={response_data}")
-            if response.status_code != 200:
-                print(f"DEBUG: Paystack error: {response_data.get('message', 'Unknown error')}")
-                return jsonify({'message': 'Payment verification failed', 'error': response_data.get('message', 'Unknown error')}), 400
-            if response_data['data']['status'] != 'success':
-                print(f"DEBUG: Payment verification failed: Status={response_data['data']['status']}, Gateway Response={response_data['data'].get('gateway_response', 'N/A')}")
-                return jsonify({'message': f'Payment not successful: {response_data["data"]["status"]}', 'error': response_data}), 400
-        except requests.exceptions.RequestException as e:
-            print(f"DEBUG: Network error verifying payment: {str(e)}")
-            return jsonify({'message': f'Error verifying payment: {str(e)}'}), 500
-
-        ticket_token = None
-        if payment.status != 'success':
-            payment.status = 'success'
-            try:
-                ticket_token = Ticket.generate_token()
-            except Exception as e:
-                print(f"DEBUG: Token generation failed: {str(e)}")
-                return jsonify({'message': f'Error generating ticket token: {str(e)}'}), 500
-
-            ticket = Ticket(
-                user_id=payment.user_id,
-                movie_id=payment.movie_id,
-                payment_id=payment.id,
-                token=ticket_token,
-                ticket_type=payment.ticket_type
-            )
-            db.session.add(ticket)
-            try:
+            response_data = paystack.verify_transaction(reference)
+        except paystack.PaystackRejected as e:
+            logger.warning('Paystack error: %s', e)
+            return jsonify({'message': 'Payment verification failed', 'error': e.data.get('message', 'Unknown error')}), 400
+        except paystack.PaystackUnavailable as e:
+            logger.warning('Paystack verify unavailable: %s', e)
+            return jsonify({'message': f'Error verifying payment: {str(e)}'}), 503
+        if response_data['data']['status'] != 'success':
+            logger.warning('Payment verification failed: Status=%s, Gateway Response=%s', response_data['data']['status'], response_data['data'].get('gateway_response', 'N/A'))
+            if response_data['data']['status'] in ('failed', 'abandoned') and payment.status == 'pending':
+                release_payment(payment)
                 db.session.commit()
-                print(f"DEBUG: Ticket created for payment {reference}, token: {ticket_token}")
-            except Exception as e:
-                db.session.rollback()
-                print(f"DEBUG: Database commit failed: {str(e)}, type: {type(e).__name__}")
-                return jsonify({'message': f'Database error: {str(e)}', 'error_type': type(e).__name__}), 500
-
-            movie = Movie.query.get(payment.movie_id)
-            user = User.query.get(payment.user_id)
-            if not movie or not user:
-                print(f"DEBUG: Missing movie ({payment.movie_id}) or user ({payment.user_id})")
-                return jsonify({'message': 'Movie or user not found'}), 404
-
-            event_title = movie.title
-            ticket_type_label = 'VIP' if payment.ticket_type == 'vip' else 'Regular'
-            flier_data_uri = ""
-            if movie.flier_image:
-                try:
-                    img = Image.open(io.BytesIO(movie.flier_image))
-                    image_format = img.format.lower() if img.format else 'jpeg'
-                    image_size = len(movie.flier_image)
-                    print(f"DEBUG: Flier image format: {image_format}, size: {image_size} bytes")
-                    if image_format in ['jpeg', 'png'] and image_size <= 16 * 1024 * 1024:
-                        flier_data_uri = f"data:image/{image_format};base64,{base64.b64encode(movie.flier_image).decode('utf-8')}"
-                    else:
-                        print(f"DEBUG: Invalid flier image format ({image_format}) or size ({image_size} bytes) for WhatsApp")
-                except Exception as e:
-                    print(f"DEBUG: Failed to process flier image: {str(e)}")
+            return jsonify({'message': f'Payment not successful: {response_data["data"]["status"]}', 'error': response_data}), 400
 
-            try:
-                sendgrid_client = current_app.config['SENDGRID_CLIENT']
-                if sendgrid_client:
-                    email_message = get_email_template(user.email, event_title, ticket_type_label, ticket_token, movie, flier_data_uri)
-                    message = Mail(
-                        from_email=current_app.config['FROM_EMAIL'],
-                        to_emails=user.email,
-                        subject=f'{ticket_type_label} Ticket for {event_title}',
-                        html_content=email_message
-                    )
-                    response = sendgrid_client.send(message)
-                    print(f"DEBUG: {ticket_type_label} Email sent to {user.email}, status: {response.status_code}, headers: {response.headers}")
-                else:
-                    print("DEBUG: SendGrid is disabled, skipping email")
-            except Exception as e:
-                print(f"DEBUG: SendGrid error for {user.email}: {str(e)}, type: {type(e).__name__}")
-
-            try:
-                twilio_client = current_app.config['TWILIO_CLIENT']
-                if twilio_client and user.phone:
-                    whatsapp_message = get_whatsapp_template(user.phone, event_title, ticket_type_label, ticket_token, movie)
-                    media_url = [flier_data_uri] if flier_data_uri else []
-                    print(f"DEBUG: WhatsApp media_url: {media_url}")
-                    response = twilio_client.messages.create(
-                        from_=current_app.config['TWILIO_WHATSAPP_FROM'],
-                        body=whatsapp_message,
-                        media_url=media_url,
-                        to=f"whatsapp:{user.phone}"
-                    )
-                    print(f"DEBUG: {ticket_type_label} WhatsApp message sent to {user.phone}, SID: {response.sid}")
-                else:
-                    print(f"DEBUG: Twilio is disabled or no phone number for user {user.email}, skipping WhatsApp message")
-            except Exception as e:
-                print(f"DEBUG: Twilio error for {user.phone}: {str(e)}, type: {type(e).__name__}")
-
-        else:
-            ticket = Ticket.query.filter_by(payment_id=payment.id).first()
-            if ticket:
-                ticket_token = ticket.token
-            else:
-                print(f"DEBUG: No ticket found for successful payment {reference}")
-                return jsonify({'message': 'No ticket found for payment'}), 404
+        try:
+            ticket, _ = issue_ticket(payment.id)
+        except LookupError as e:
+            db.session.rollback()
+            logger.warning('Cannot issue ticket for %s: %s', reference, e)
+            return jsonify({'message': 'Movie or user not found'}), 404
+        if ticket is None:
+            logger.debug('No ticket found for successful payment %s', reference)
+            return jsonify({'message': 'No ticket found for payment'}), 404
+        ticket_token = ticket.token
+        db.session.commit()
 
         return jsonify({
             'message': 'Payment verified',
@@ -889,24 +665,19 @@ def verify_payment(reference):
         }), 200
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/payments/verify/{reference}: {str(e)}")
+        logger.exception('Error in /api/payments/verify/%s: %s', reference, e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/send-event-email', methods=['POST'])
-@jwt_required()
+@admin_required
 def send_event_email():
-    print("DEBUG: /api/admin/send-event-email endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         data = request.json
         if not all(key in data for key in ['movie_id', 'email', 'phone']):
             return jsonify({'message': 'Missing required fields: movie_id, email, phone'}), 400
         movie = Movie.query.get(data['movie_id'])
         if not movie:
-            print(f"DEBUG: Movie not found for movie_id: {data['movie_id']}")
+            logger.info('Movie not found for movie_id: %s', data['movie_id'])
             return jsonify({'message': 'Movie not found'}), 404
 
         email_list = [email.strip() for email in data['email'].split(',')]
@@ -920,73 +691,37 @@ def send_event_email():
             if not is_valid_phone(phone):
                 return jsonify({'message': f'Invalid phone format: {phone}'}), 400
 
-        ticket_tokens = []
-
-        for email, phone in zip(email_list, phone_list):
-            target_user = User.query.filter_by(email=email).first()
-            if not target_user:
-                print(f"DEBUG: User not found for email: {email}, creating new user")
-                random_password = secrets.token_urlsafe(12)
-                target_user = User(email=email, phone=phone)
-                target_user.set_password(random_password)
-                db.session.add(target_user)
-                db.session.commit()
-                print(f"DEBUG: New user created with email: {email}, phone: {phone}")
-
-            ticket_token = Ticket.generate_token()
-            ticket = Ticket(
-                user_id=target_user.id,
-                movie_id=data['movie_id'],
-                token=ticket_token,
-                ticket_type='vip'
-            )
-            db.session.add(ticket)
-            ticket_tokens.append({'email': email, 'ticket_token': ticket_token})
-
-            flier_data_uri = f"data:image/jpeg;base64,{base64.b64encode(movie.flier_image).decode('utf-8')}" if movie.flier_image else ""
-
-            email_message = get_email_template(email, movie.title, 'VIP', ticket_token, movie, flier_data_uri)
-
-            message = Mail(
-                from_email=current_app.config['FROM_EMAIL'],
-                to_emails=To(email),
-                subject=f'VIP Ticket for {movie.title}',
-                html_content=email_message
-            )
-            try:
-                sendgrid_client = current_app.config['SENDGRID_CLIENT']
-                if sendgrid_client:
-                    sendgrid_client.send(message)
-                    print(f"DEBUG: VIP Email sent to {email} via SendGrid")
-                else:
-                    print("DEBUG: SendGrid is disabled, skipping email")
-            except Exception as e:
-                print(f"DEBUG: SendGrid error for {email}: {str(e)}")
+        report = issue_vip_tickets(movie.id, list(zip(email_list, phone_list)), match_on='email')
+        ticket_tokens = [{'email': guest['email'], 'ticket_token': guest['ticket_token']} for guest in report['issued']]
+        messages = [campaigns.batch_email_message(guest['email'], guest['ticket_token']) for guest in report['issued']]
+        flier_src = email_image_url(get_rendition(movie, 'medium', 'jpeg'))
 
+        job = campaigns.submit_job('event_email', messages, movie_id=movie.id, created_by=int(get_jwt_identity()),
+                                   email_subject=f'VIP Ticket for {movie.title}',
+                                   email_template=ticket_email_batch(movie, 'VIP', flier_src))
         db.session.commit()
-        return jsonify({'message': 'Emails sent', 'tickets': ticket_tokens})
+        return jsonify({'message': 'Emails queued', 'job_id': job.id, 'tickets': ticket_tokens,
+                        'failed': report['failed']}), 202
+    except SoldOut as e:
+        db.session.rollback()
+        logger.info('%s', e)
+        return jsonify({'message': 'VIP tickets sold out'}), 400
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/admin/send-event-email: {str(e)}")
+        logger.exception('Error in /api/admin/send-event-email: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/send-whatsapp', methods=['POST'])
-@jwt_required()
+@admin_required
 def send_whatsapp():
-    print("DEBUG: /api/admin/send-whatsapp endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         data = request.json
         if not all(key in data for key in ['movie_id', 'phone']):
             return jsonify({'message': 'Missing required fields: movie_id, phone'}), 400
         movie_id = data['movie_id']
-        print(f"DEBUG: Processing movie_id: {movie_id}")
         movie = Movie.query.get(movie_id)
         if not movie:
-            print(f"DEBUG: Movie not found for movie_id: {movie_id}")
+            logger.info('Movie not found for movie_id: %s', movie_id)
             return jsonify({'message': 'Movie not found'}), 404
 
         phone_list = [phone.strip() for phone in data['phone'].split(',')]
@@ -994,72 +729,49 @@ def send_whatsapp():
             if not is_valid_phone(phone):
                 return jsonify({'message': f'Invalid phone format: {phone}'}), 400
 
-        errors = []
+        if not current_app.config['TWILIO_CLIENT']:
+            error_msg = 'Twilio client not configured'
+            logger.warning('%s', error_msg)
+            return jsonify({'message': error_msg}), 500
+
         ticket_tokens = []
+        messages = []
+        flier = get_rendition(movie, 'medium', 'jpeg')
+        tokens = iter(Ticket.generate_tokens(len(phone_list)))
 
-        try:
-            twilio_client = current_app.config['TWILIO_CLIENT']
-            if twilio_client:
-                media_url = []
-                if movie.flier_image:
-                    media_url = [upload_image_to_twilio(movie.flier_image, twilio_client)]
-                    media_url = [url for url in media_url if url]
-                print(f"DEBUG: Preparing WhatsApp messages, has_image: {bool(movie.flier_image)}, media_url: {media_url}")
-
-                for phone in phone_list:
-                    try:
-                        target_user = User.query.filter_by(phone=phone).first()
-                        ticket_token = None
-                        if target_user:
-                            ticket_token = Ticket.generate_token()
-                            ticket = Ticket(
-                                user_id=target_user.id,
-                                movie_id=movie_id,
-                                token=ticket_token,
-                                ticket_type='vip'
-                            )
-                            db.session.add(ticket)
-                            ticket_tokens.append({'phone': phone, 'ticket_token': ticket_token})
-
-                        whatsapp_message = get_whatsapp_template(phone, movie.title, 'VIP', ticket_token, movie)
-                        response = twilio_client.messages.create(
-                            from_=current_app.config['TWILIO_WHATSAPP_FROM'],
-                            body=whatsapp_message,
-                            media_url=media_url,
-                            to=f"whatsapp:{phone}"
-                        )
-                        print(f"DEBUG: WhatsApp message sent to {phone}, SID: {response.sid}")
-                    except Exception as e:
-                        error_msg = f"Twilio error for {phone}: {str(e)}"
-                        print(f"DEBUG: {error_msg}")
-                        errors.append(error_msg)
-                db.session.commit()
-                if errors:
-                    return jsonify({'message': 'Some WhatsApp messages failed', 'errors': errors, 'tickets': ticket_tokens}), 207
-                return jsonify({'message': 'WhatsApp messages sent', 'tickets': ticket_tokens})
-            else:
-                error_msg = 'Twilio client not configured'
-                print(f"DEBUG: {error_msg}")
-                return jsonify({'message': error_msg}), 500
-        except Exception as e:
-            db.session.rollback()
-            error_msg = f'Twilio error: {str(e)}'
-            print(f"DEBUG: {error_msg}")
-            return jsonify({'message': error_msg}), 500
+        for phone in phone_list:
+            target_user = User.query.filter_by(phone=phone).first()
+            ticket_token = None
+            if target_user:
+                allocate_vip(movie.id)
+                ticket = create_ticket(
+                    token=next(tokens),
+                    user_id=target_user.id,
+                    movie_id=movie_id,
+                    ticket_type='vip'
+                )
+                ticket_token = ticket.token
+                ticket_tokens.append({'phone': phone, 'ticket_token': ticket_token})
+
+            whatsapp_message = ticket_whatsapp(movie, phone, ticket_token, 'VIP')
+            messages.append(campaigns.whatsapp_message(phone, whatsapp_message, flier, ticket_token))
+
+        job = campaigns.submit_job('whatsapp', messages, movie_id=movie.id, created_by=int(get_jwt_identity()))
+        db.session.commit()
+        return jsonify({'message': 'WhatsApp messages queued', 'job_id': job.id, 'tickets': ticket_tokens}), 202
+    except SoldOut as e:
+        db.session.rollback()
+        logger.info('%s', e)
+        return jsonify({'message': 'VIP tickets sold out'}), 400
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/admin/send-whatsapp: {str(e)}")
+        logger.exception('Error in /api/admin/send-whatsapp: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/send-vip-ticket', methods=['POST'])
-@jwt_required()
+@admin_required
 def send_vip_ticket():
-    print("DEBUG: /api/admin/send-vip-ticket endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         data = request.json
         if not all(key in data for key in ['movie_id', 'recipient', 'phone', 'method']):
             return jsonify({'message': 'Missing required fields: movie_id, recipient, phone, method'}), 400
@@ -1068,7 +780,7 @@ def send_vip_ticket():
 
         movie = Movie.query.get(data['movie_id'])
         if not movie:
-            print(f"DEBUG: Movie not found for movie_id: {data['movie_id']}")
+            logger.info('Movie not found for movie_id: %s', data['movie_id'])
             return jsonify({'message': 'Movie not found'}), 404
 
         recipient_list = [recipient.strip() for recipient in data['recipient'].split(',')]
@@ -1084,116 +796,38 @@ def send_vip_ticket():
             if not is_valid_phone(phone):
                 return jsonify({'message': f'Invalid phone format: {phone}'}), 400
 
-        vip_limit = int(Setting.query.filter_by(key='vip_limit').first().value)
-        vip_count = Ticket.query.filter_by(movie_id=data['movie_id'], ticket_type='vip').count()
-        if vip_count + len(phone_list) > vip_limit:
-            print(f"DEBUG: VIP limit exceeded: {vip_count + len(phone_list)}/{vip_limit}")
-            return jsonify({'message': 'VIP tickets sold out'}), 400
-
-        ticket_tokens = []
-        errors = []
-
-        for recipient, phone in zip(recipient_list, phone_list):
-            try:
-                target_user = None
-                if data['method'] == 'email':
-                    target_user = User.query.filter_by(email=recipient).first()
-                    if not target_user:
-                        print(f"DEBUG: User not found for email: {recipient}, creating new user")
-                        random_password = secrets.token_urlsafe(12)
-                        target_user = User(email=recipient, phone=phone)
-                        target_user.set_password(random_password)
-                        db.session.add(target_user)
-                        db.session.commit()
-                        print(f"DEBUG: New user created with email: {recipient}, phone: {phone}")
-                else:
-                    target_user = User.query.filter_by(phone=phone).first()
-                    if not target_user:
-                        print(f"DEBUG: User not found for phone: {phone}, creating new user")
-                        random_email = f"vip_{secrets.token_hex(8)}@example.com"
-                        random_password = secrets.token_urlsafe(12)
-                        target_user = User(email=random_email, phone=phone)
-                        target_user.set_password(random_password)
-                        db.session.add(target_user)
-                        db.session.commit()
-                        print(f"DEBUG: New user created with phone: {phone}, email: {random_email}")
-
-                ticket_token = Ticket.generate_token()
-                ticket = Ticket(
-                    user_id=target_user.id,
-                    movie_id=data['movie_id'],
-                    token=ticket_token,
-                    ticket_type='vip'
-                )
-                db.session.add(ticket)
-                ticket_tokens.append({'recipient': recipient, 'phone': phone, 'ticket_token': ticket_token})
-
-                flier_data_uri = f"data:image/jpeg;base64,{base64.b64encode(movie.flier_image).decode('utf-8')}" if movie.flier_image else ""
-
-                if data['method'] == 'email':
-                    email_message = get_email_template(recipient, movie.title, 'VIP', ticket_token, movie, flier_data_uri)
-                    message = Mail(
-                        from_email=current_app.config['FROM_EMAIL'],
-                        to_emails=To(recipient),
-                        subject=f'VIP Ticket for {movie.title}',
-                        html_content=email_message
-                    )
-                    try:
-                        sendgrid_client = current_app.config['SENDGRID_CLIENT']
-                        if sendgrid_client:
-                            response = sendgrid_client.send(message)
-                            print(f"DEBUG: VIP email sent to {recipient}, status: {response.status_code}")
-                        else:
-                            print("DEBUG: SendGrid is disabled, skipping email")
-                            errors.append(f"SendGrid not configured for {recipient}")
-                    except Exception as e:
-                        print(f"DEBUG: SendGrid error for {recipient}: {str(e)}")
-                        errors.append(f"Error sending email to {recipient}: {str(e)}")
-                else:
-                    try:
-                        twilio_client = current_app.config['TWILIO_CLIENT']
-                        if twilio_client:
-                            whatsapp_message = get_whatsapp_template(phone, movie.title, 'VIP', ticket_token, movie)
-                            media_url = []
-                            if movie.flier_image:
-                                media_url = [upload_image_to_twilio(movie.flier_image, twilio_client)]
-                                media_url = [url for url in media_url if url]
-                            print(f"DEBUG: Sending VIP WhatsApp to {phone}, has_image: {bool(movie.flier_image)}, media_url: {media_url}")
-                            response = twilio_client.messages.create(
-                                from_=current_app.config['TWILIO_WHATSAPP_FROM'],
-                                body=whatsapp_message,
-                                media_url=media_url,
-                                to=f"whatsapp:{phone}"
-                            )
-                            print(f"DEBUG: VIP WhatsApp message sent to {phone}, SID: {response.sid}")
-                        else:
-                            print("DEBUG: Twilio is disabled, skipping WhatsApp message")
-                            errors.append(f"Twilio not configured for {phone}")
-                    except Exception as e:
-                        print(f"DEBUG: Twilio error for {phone}: {str(e)}")
-                        errors.append(f"Error sending WhatsApp to {phone}: {str(e)}")
-            except Exception as e:
-                print(f"DEBUG: Error processing {recipient}/{phone}: {str(e)}")
-                errors.append(f"Error for {recipient}/{phone}: {str(e)}")
+        report = issue_vip_tickets(movie.id, list(zip(recipient_list, phone_list)),
+                                   match_on='email' if data['method'] == 'email' else 'phone')
+        ticket_tokens = [{'recipient': guest['email'], 'phone': guest['phone'], 'ticket_token': guest['ticket_token']}
+                         for guest in report['issued']]
+        flier = get_rendition(movie, 'medium', 'jpeg')
 
+        if data['method'] == 'email':
+            messages = [campaigns.batch_email_message(guest['email'], guest['ticket_token']) for guest in report['issued']]
+            job = campaigns.submit_job('vip_ticket', messages, movie_id=movie.id, created_by=int(get_jwt_identity()),
+                                       email_subject=f'VIP Ticket for {movie.title}',
+                                       email_template=ticket_email_batch(movie, 'VIP', email_image_url(flier)))
+        else:
+            messages = [campaigns.whatsapp_message(guest['phone'], ticket_whatsapp(movie, guest['phone'], guest['ticket_token'], 'VIP'),
+                                                   flier, guest['ticket_token'])
+                        for guest in report['issued']]
+            job = campaigns.submit_job('vip_ticket', messages, movie_id=movie.id, created_by=int(get_jwt_identity()))
         db.session.commit()
-        if errors:
-            return jsonify({'message': 'Some VIP tickets failed to send', 'errors': errors, 'tickets': ticket_tokens}), 207
-        return jsonify({'message': f'VIP tickets sent via {data['method']}', 'tickets': ticket_tokens})
+        return jsonify({'message': f'VIP tickets queued via {data['method']}', 'job_id': job.id, 'tickets': ticket_tokens,
+                        'failed': report['failed']}), 202
+    except SoldOut as e:
+        db.session.rollback()
+        logger.info('%s', e)
+        return jsonify({'message': 'VIP tickets sold out'}), 400
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/admin/send-vip-ticket: {str(e)}")
+        logger.exception('Error in /api/admin/send-vip-ticket: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/send-reminder', methods=['POST'])
-@jwt_required()
+@admin_required
 def send_reminder():
-    print("DEBUG: /api/admin/send-reminder endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         data = request.json
         if not all(key in data for key in ['movie_id', 'recipients', 'phones', 'method', 'message']):
             return jsonify({'message': 'Missing required fields: movie_id, recipients, phones, method, message'}), 400
@@ -1202,7 +836,7 @@ def send_reminder():
 
         movie = Movie.query.get(data['movie_id'])
         if not movie:
-            print(f"DEBUG: Movie not found for movie_id: {data['movie_id']}")
+            logger.info('Movie not found for movie_id: %s', data['movie_id'])
             return jsonify({'message': 'Movie not found'}), 404
 
         recipient_list = [recipient.strip() for recipient in data['recipients'].split(',')]
@@ -1218,143 +852,59 @@ def send_reminder():
             if not is_valid_phone(phone):
                 return jsonify({'message': f'Invalid phone format: {phone}'}), 400
 
-        errors = []
-
-        flier_data_uri = f"data:image/jpeg;base64,{base64.b64encode(movie.flier_image).decode('utf-8')}" if movie.flier_image else ""
+        messages = []
+        email_subject = email_template = None
 
         if data['method'] == 'email':
-            for recipient, phone in zip(recipient_list, phone_list):
-                try:
-                    email_message = f"""
-                    <html>
-                    <head>
-                        <style>
-                            body {{ font-family: Arial, sans-serif; color: #333; line-height: 1.6; background-color: #f4f4f4; padding: 20px; }}
-                            .container {{ max-width: 600px; margin: 0 auto; background: #fff; padding: 20px; border-radius: 8px; box-shadow: 0 0 10px rgba(0,0,0,0.1); }}
-                            h1 {{ color: #d32f2f; text-align: center; }}
-                            h3 {{ color: #333; }}
-                            p {{ margin: 10px 0; }}
-                            .highlight {{ background: #ffebee; padding: 10px; border-radius: 4px; text-align: center; font-weight: bold; }}
-                            .schedule {{ background: #e3f2fd; padding: 15px; border-radius: 4px; }}
-                            .footer {{ text-align: center; margin-top: 20px; font-size: 12px; color: #777; }}
-                            .image {{ max-width: 100%; height: auto; margin-top: 20px; }}
-                        </style>
-                    </head>
-                    <body>
-                        <div class="container">
-                            <h1>Reminder: {movie.title} Premiere</h1>
-                            <p>Dear {recipient},</p>
-                            <p>{data['message']}</p>
-                            <h3>Event Details</h3>
-                            <p><strong>Movie:</strong> {movie.title}</p>
-                            <p><strong>Date:</strong> 22nd November 2025</p>
-                            <p><strong>Time:</strong> 6:00 PM</p>
-                            <p><strong>Venue:</strong> Ozene Cinema, Yaba</p>
-                            <p><strong>Colour Code:</strong> 🖤 Black and Deep Berry Wine</p>
-                            <h3>Evening Schedule</h3>
-                            <div class="schedule">
-                                <p>🕕 6:00 PM – Red Carpet Arrival & Check-in</p>
-                                <p>🕕 6:00–6:30 PM – Meet & Greet Session</p>
-                                <p>🕖 7:00 PM – Showtime Begins</p>
-                                <p>🕘 9:00 PM – Closing Moments & Curtain Call</p>
-                            </div>
-                            <p>🍹 Complimentary refreshments and photo opportunities with the cast await you!</p>
-                            <p>We’re excited to see you at this cinematic experience!</p>
-                            {f'<img src="{flier_data_uri}" alt="Movie Flier" class="image">' if flier_data_uri else ''}
-                            <p class="footer">Warm regards,<br>The {movie.title} Premiere Team</p>
-                        </div>
-                    </body>
-                    </html>
-                    """
-                    message = Mail(
-                        from_email=current_app.config['FROM_EMAIL'],
-                        to_emails=To(recipient),
-                        subject=f'Reminder: {movie.title}',
-                        html_content=email_message
-                    )
-                    sendgrid_client = current_app.config['SENDGRID_CLIENT']
-                    if sendgrid_client:
-                        sendgrid_client.send(message)
-                        print(f"DEBUG: Reminder email sent to {recipient}")
-                    else:
-                        print("DEBUG: SendGrid is disabled, skipping email")
-                except Exception as e:
-                    error_msg = f"SendGrid error for {recipient}: {str(e)}"
-                    print(f"DEBUG: {error_msg}")
-                    errors.append(error_msg)
+            email_subject = f'Reminder: {movie.title}'
+            email_template = reminder_email_batch(movie, data['message'], email_image_url(get_rendition(movie, 'medium', 'jpeg')))
+            messages = [campaigns.batch_email_message(recipient) for recipient in recipient_list]
         else:
-            try:
-                twilio_client = current_app.config['TWILIO_CLIENT']
-                if twilio_client:
-                    for phone in phone_list:
-                        try:
-                            whatsapp_message = f"""
-📢 *Reminder: {movie.title} Premiere*
-
-Dear {phone},
-
-{data['message']}
-
-🎥 *Event*: {movie.title}
-📅 *Date*: 22nd November 2025
-🕕 *Time*: 6:00 PM
-📍 *Venue*: Ozene Cinema, Yaba
-🎨 *Colour Code*: Black and Deep Berry Wine
-
-*Evening Schedule*:
-🕕 6:00 PM – Red Carpet Arrival & Check-in
-🕕 6:00–6:30 PM – Meet & Greet Session
-🕖 7:00 PM – Showtime Begins
-🕘 9:00 PM – Closing Moments & Curtain Call
-
-🍹 Complimentary refreshments and photo opportunities with the cast await you!
-
-We’re excited to see you there!
-
-Warm regards,
-The {movie.title} Premiere Team
-"""
-                            media_url = []
-                            if movie.flier_image:
-                                media_url = [upload_image_to_twilio(movie.flier_image, twilio_client)]
-                                media_url = [url for url in media_url if url]
-                            print(f"DEBUG: Sending reminder WhatsApp to {phone}, has_image: {bool(movie.flier_image)}, media_url: {media_url}")
-                            twilio_client.messages.create(
-                                from_=current_app.config['TWILIO_WHATSAPP_FROM'],
-                                body=whatsapp_message,
-                                media_url=media_url,
-                                to=f"whatsapp:{phone}"
-                            )
-                            print(f"DEBUG: Reminder WhatsApp message sent to {phone}")
-                        except Exception as e:
-                            error_msg = f"Twilio error for {phone}: {str(e)}"
-                            print(f"DEBUG: {error_msg}")
-                            errors.append(error_msg)
-                else:
-                    error_msg = 'Twilio client not configured'
-                    print(f"DEBUG: {error_msg}")
-                    return jsonify({'message': error_msg}), 500
-            except Exception as e:
-                error_msg = f'Twilio error: {str(e)}'
-                print(f"DEBUG: {error_msg}")
+            if not current_app.config['TWILIO_CLIENT']:
+                error_msg = 'Twilio client not configured'
+                logger.warning('%s', error_msg)
                 return jsonify({'message': error_msg}), 500
+            flier = get_rendition(movie, 'medium', 'jpeg')
+            for phone in phone_list:
+                whatsapp_message = reminder_whatsapp(movie, phone, data['message'])
+                messages.append(campaigns.whatsapp_message(phone, whatsapp_message, flier))
+
+        job = campaigns.submit_job('reminder', messages, movie_id=movie.id, created_by=int(get_jwt_identity()),
+                                   email_subject=email_subject, email_template=email_template)
+        db.session.commit()
+        return jsonify({'message': 'Reminder messages queued', 'job_id': job.id}), 202
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error in /api/admin/send-reminder: %s', e)
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
+@api_blueprint.route('/admin/jobs', methods=['GET'])
+@admin_required
+def list_bulk_jobs():
+    try:
+        jobs = BulkJob.query.order_by(BulkJob.created_at.desc()).limit(50).all()
+        return jsonify([campaigns.job_to_dict(job) for job in jobs])
+    except Exception as e:
+        logger.exception('Error in /api/admin/jobs: %s', e)
+        return jsonify({'message': f'Error: {str(e)}'}), 500
 
-        if errors:
-            return jsonify({'message': 'Some reminder messages failed', 'errors': errors}), 207
-        return jsonify({'message': 'Reminder messages sent'})
+@api_blueprint.route('/admin/jobs/<job_id>', methods=['GET'])
+@admin_required
+def get_bulk_job(job_id):
+    try:
+        job = db.session.get(BulkJob, job_id)
+        if not job:
+            return jsonify({'message': 'Job not found'}), 404
+        include_recipients = request.args.get('recipients', 'true').lower() != 'false'
+        return jsonify(campaigns.job_to_dict(job, include_recipients=include_recipients))
     except Exception as e:
-        print(f"DEBUG: Error in /api/admin/send-reminder: {str(e)}")
+        logger.exception('Error in /api/admin/jobs/%s: %s', job_id, e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/settings', methods=['POST'])
-@jwt_required()
+@admin_required
 def update_settings():
-    print("DEBUG: /api/settings POST endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
         data = request.json
         vip_price = data.get('vip_price')
         vip_limit = data.get('vip_limit')
@@ -1363,48 +913,39 @@ def update_settings():
         if vip_price is not None:
             if float(vip_price) <= 0:
                 return jsonify({'message': 'VIP price must be positive'}), 400
-            setting = Setting.query.filter_by(key='vip_price').first()
-            setting.value = str(float(vip_price))
-            db.session.commit()
+            set_setting('vip_price', float(vip_price))
         if vip_limit is not None:
             if int(vip_limit) < 0:
                 return jsonify({'message': 'VIP limit must be non-negative'}), 400
-            setting = Setting.query.filter_by(key='vip_limit').first()
-            setting.value = str(int(vip_limit))
-            db.session.commit()
+            set_setting('vip_limit', int(vip_limit))
+        bump_catalogue_version()
+        db.session.commit()
+        invalidate_settings()
         return jsonify({'message': 'Settings updated'})
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Error in /api/settings POST: {str(e)}")
+        logger.exception('Error in /api/settings POST: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/settings', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_settings():
-    print("DEBUG: /api/settings GET endpoint called")
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user.is_admin:
-            return jsonify({'message': 'Admin access required'}), 403
-        settings = Setting.query.all()
+        settings = Setting.query.filter(Setting.key.notin_([SETTINGS_VERSION_KEY, CATALOGUE_VERSION_KEY])).all()
         return jsonify({s.key: s.value for s in settings})
     except Exception as e:
-        print(f"DEBUG: Error in /api/settings GET: {str(e)}")
+        logger.exception('Error in /api/settings GET: %s', e)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @api_blueprint.route('/admin/test', methods=['POST'])
 @jwt_required()
 def test_route():
-    print("DEBUG: /api/admin/test endpoint called")
     return jsonify({'message': 'Test route works'})
 
 @api_blueprint.route('/admin/no-auth-test', methods=['POST'])
 def no_auth_test():
-    print("DEBUG: /api/admin/no-auth-test endpoint called")
     return jsonify({'message': 'No auth test route works'})
 
 @api_blueprint.route('/debug', methods=['GET'])
 def debug():
-    print("DEBUG: /api/debug endpoint called")
     return jsonify({'message': 'Blueprint v1 is active'})
\ No newline at end of file
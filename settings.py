@@ -0,0 +1,87 @@
+from extensions import db
+from models import Setting
+from threading import Lock
+import secrets
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Known settings and the type their string value is parsed into.
+SCHEMA = {
+    'regular_price': float,
+    'vip_price': float,
+    'vip_limit': int,
+}
+# Row rewritten on every change; workers compare it to notice writes made elsewhere.
+VERSION_KEY = 'settings_version'
+# How often a worker re-reads the version stamp; one tiny query per interval instead of one per read.
+CHECK_INTERVAL = float(os.getenv('SETTINGS_CHECK_SECONDS', '5'))
+
+_lock = Lock()
+_cache = {'values': {}, 'version': None, 'checked': 0.0}
+
+
+def _parse(key, value):
+    return SCHEMA.get(key, str)(value)
+
+
+def load_settings():
+    """Read every setting into the cache along with the current version stamp."""
+    rows = {s.key: s.value for s in Setting.query.all()}
+    version = rows.pop(VERSION_KEY, None)
+    values = {key: _parse(key, value) for key, value in rows.items()}
+    with _lock:
+        _cache.update(values=values, version=version, checked=time.monotonic())
+    return values
+
+
+def _refresh_if_stale():
+    if time.monotonic() - _cache['checked'] < CHECK_INTERVAL:
+        return
+    version = db.session.query(Setting.value).filter_by(key=VERSION_KEY).scalar()
+    if version != _cache['version']:
+        logger.debug('Settings version changed (%s -> %s), reloading', _cache['version'], version)
+        load_settings()
+    else:
+        _cache['checked'] = time.monotonic()
+
+
+def get_setting(key, default=None):
+    """Typed value of a setting, served from the cache and falling back to the DB on a miss."""
+    _refresh_if_stale()
+    values = _cache['values']
+    if key in values:
+        return values[key]
+    setting = Setting.query.filter_by(key=key).first()
+    if not setting:
+        return default
+    value = _parse(key, setting.value)
+    with _lock:
+        _cache['values'] = {**_cache['values'], key: value}
+    return value
+
+
+def set_setting(key, value):
+    """Write a setting and bump the version stamp.
+
+    Call invalidate_settings() after committing so this worker reloads at once; the
+    others pick the change up within CHECK_INTERVAL.
+    """
+    setting = Setting.query.filter_by(key=key).first()
+    if setting:
+        setting.value = str(value)
+    else:
+        db.session.add(Setting(key=key, value=str(value)))
+    stamp = Setting.query.filter_by(key=VERSION_KEY).first()
+    if stamp:
+        stamp.value = secrets.token_hex(8)
+    else:
+        db.session.add(Setting(key=VERSION_KEY, value=secrets.token_hex(8)))
+
+
+def invalidate_settings():
+    """Force the next read in this process to check the version stamp."""
+    with _lock:
+        _cache.update(version=None, checked=0.0)
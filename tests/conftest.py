@@ -0,0 +1,109 @@
+from datetime import date
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads its configuration at import time, so the test settings go in first.
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ohams-tests-'), 'app.db')}",
+    'JWT_SECRET_KEY': 'test-secret',
+    'SENDGRID_API_KEY': 'SG.test',
+    'TWILIO_ACCOUNT_SID': 'ACtest',
+    'TWILIO_AUTH_TOKEN': 'test',
+    'TWILIO_WHATSAPP_FROM': 'whatsapp:+10000000000',
+    'PAYSTACK_SECRET_KEY': 'sk_test_secret',
+    'PAYSTACK_BASE_URL': 'http://paystack.invalid',
+    'BACKEND_URL': 'https://api.test',
+    'NOTIFICATION_PROVIDER': 'local',
+    'BACKGROUND_WORKER': 'off',
+})
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """A test client over a freshly created database."""
+    from extensions import db
+    from models import init_db
+    import auth
+    with app.app_context():
+        db.drop_all()
+        init_db(app)
+    app.extensions.pop('notification_provider', None)
+    auth._roles.clear()
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers(app, client):
+    from extensions import db
+    from models import User
+    with app.app_context():
+        admin = User(email='admin@example.com', phone='+2348000000000', is_admin=True)
+        admin.set_password('password')
+        db.session.add(admin)
+        db.session.commit()
+    token = client.post('/api/login', json={'email': 'admin@example.com', 'password': 'password'}).json['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def movie_id(app, client):
+    from extensions import db
+    from models import Movie
+    with app.app_context():
+        movie = Movie(title='Love & War', premiere_date=date(2025, 11, 22), price=13000)
+        db.session.add(movie)
+        db.session.commit()
+        return movie.id
+
+
+@pytest.fixture
+def paystack_mock(monkeypatch):
+    """mock_paystack served on a local port, with PAYSTACK_BASE_URL pointing at it; yields its state."""
+    from werkzeug.serving import make_server
+    from mock_paystack import create_mock_app
+    mock = create_mock_app('success')
+    server = make_server('127.0.0.1', 0, mock, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('PAYSTACK_BASE_URL', f'http://127.0.0.1:{server.server_port}')
+    yield mock.extensions['mock_paystack']
+    server.shutdown()
+    thread.join()
+
+
+@pytest.fixture
+def checkout(client, admin_headers):
+    """Start a Paystack checkout as the admin user; returns its reference."""
+    def start(movie_id, ticket_type='regular'):
+        response = client.post('/api/payments/initialize', headers=admin_headers,
+                               json={'movie_id': movie_id, 'email': 'admin@example.com', 'ticket_type': ticket_type})
+        assert response.status_code == 200, response.json
+        return response.json['reference']
+    return start
+
+
+@pytest.fixture
+def send_webhook(client):
+    """POST a Paystack event signed with the test secret key."""
+    def send(event, reference, transaction_id=1):
+        body = json.dumps({'event': event, 'data': {'id': transaction_id, 'reference': reference}}).encode()
+        signature = hmac.new(os.environ['PAYSTACK_SECRET_KEY'].encode(), body, hashlib.sha512).hexdigest()
+        return client.post('/api/payment-webhook', data=body, content_type='application/json',
+                           headers={'x-paystack-signature': signature})
+    return send
@@ -0,0 +1,18 @@
+import os
+
+from catalogue import FileBackend
+
+
+def test_file_backend_evicts_least_recently_used(tmp_path):
+    cache = FileBackend(str(tmp_path), max_entries=2)
+    cache.set('v1', b'one')
+    cache.set('v2', b'two')
+    os.utime(cache._path('v1'), ns=(1, 1))
+    os.utime(cache._path('v2'), ns=(2, 2))
+    assert cache.get('v1') == b'one'  # now the most recently used
+
+    cache.set('v3', b'three')
+    assert len(os.listdir(tmp_path)) == 2
+    assert cache.get('v2') is None
+    assert cache.get('v1') == b'one'
+    assert cache.get('v3') == b'three'
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from inventory import SoldOut, allocate_vip, reserve_vip
+from models import MovieInventory, SeatHold, Ticket, User, UNUSABLE_PASSWORD
+from settings import invalidate_settings, set_setting
+
+
+@pytest.fixture
+def vip_limit(app, client):
+    def set_limit(limit):
+        with app.app_context():
+            set_setting('vip_limit', limit)
+            db.session.commit()
+        invalidate_settings()
+    return set_limit
+
+
+def _vip_sold(movie_id):
+    return db.session.get(MovieInventory, movie_id).vip_sold
+
+
+def test_sold_out_once_sales_and_holds_reach_limit(app, movie_id, vip_limit):
+    vip_limit(2)
+    with app.app_context():
+        allocate_vip(movie_id)
+        reserve_vip(movie_id)
+        db.session.commit()
+        with pytest.raises(SoldOut):
+            reserve_vip(movie_id)
+        db.session.rollback()
+        with pytest.raises(SoldOut):
+            allocate_vip(movie_id)
+
+
+def test_expired_hold_frees_its_seat(app, movie_id, vip_limit):
+    vip_limit(1)
+    with app.app_context():
+        hold = reserve_vip(movie_id)
+        db.session.commit()
+        hold.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+        reserve_vip(movie_id)
+        db.session.commit()
+        # The expired hold was swept; only the fresh one counts against the limit.
+        [active] = SeatHold.query.all()
+        assert active.expires_at > datetime.utcnow()
+
+
+def _vip_ticket(movie_id, user_id, token):
+    allocate_vip(movie_id)
+    ticket = Ticket(user_id=user_id, movie_id=movie_id, token=token, ticket_type='vip')
+    db.session.add(ticket)
+    db.session.commit()
+    return ticket.id
+
+
+def test_deleting_vip_ticket_releases_seat(app, client, admin_headers, movie_id):
+    with app.app_context():
+        ticket_id = _vip_ticket(movie_id, 1, 'TICKET1')
+        assert _vip_sold(movie_id) == 1
+    assert client.delete(f'/api/admin/tickets/{ticket_id}', headers=admin_headers).status_code == 200
+    with app.app_context():
+        assert _vip_sold(movie_id) == 0
+
+
+def test_deleting_user_releases_their_vip_seats(app, client, admin_headers, movie_id):
+    with app.app_context():
+        guest = User(email='guest@example.com', phone='+2348000000001', password_hash=UNUSABLE_PASSWORD)
+        db.session.add(guest)
+        db.session.commit()
+        guest_id = guest.id
+        _vip_ticket(movie_id, guest_id, 'TICKET1')
+        _vip_ticket(movie_id, guest_id, 'TICKET2')
+        assert _vip_sold(movie_id) == 2
+    assert client.delete(f'/api/admin/users/{guest_id}', headers=admin_headers).status_code == 200
+    with app.app_context():
+        assert _vip_sold(movie_id) == 0
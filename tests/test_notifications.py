@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from extensions import db
+from messages import email_substitutions
+from models import NotificationOutbox
+from notifications import LocalProvider, drain_outbox, enqueue_email, get_provider
+
+
+def test_local_provider_is_selected(app, client):
+    with app.app_context():
+        assert isinstance(get_provider(), LocalProvider)
+
+
+def test_outbox_retries_after_provider_failure(app, client):
+    with app.app_context():
+        provider = get_provider()
+        provider.fail_next = 1
+        enqueue_email('guest@example.com', 'Your ticket', '<p>Ticket</p>')
+        db.session.commit()
+
+        assert drain_outbox() == 1
+        message = NotificationOutbox.query.one()
+        assert message.status == 'pending'
+        assert message.last_error == 'Simulated email provider failure'
+        assert provider.sent == []
+
+        message.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert drain_outbox() == 1
+        assert NotificationOutbox.query.one().status == 'sent'
+        assert provider.sent == [{'channel': 'email', 'recipient': 'guest@example.com',
+                                  'subject': 'Your ticket', 'html': '<p>Ticket</p>'}]
+
+
+def test_local_provider_fills_batch_substitutions():
+    provider = LocalProvider()
+    template = '<p>Dear <%recipient%>, your code is <%ticket_token%></p>'
+    provider.send_email_batch('VIP Ticket', template, [
+        ('a@example.com', email_substitutions('a@example.com', 'AAAAAA1')),
+        ('b<x>@example.com', email_substitutions('b<x>@example.com')),
+    ])
+    [batch] = provider.sent
+    assert batch['channel'] == 'email_batch'
+    assert [message['html'] for message in batch['messages']] == [
+        '<p>Dear a@example.com, your code is AAAAAA1</p>',
+        '<p>Dear b&lt;x&gt;@example.com, your code is </p>',
+    ]
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+import os
+
+import requests
+
+import reconcile
+import webhooks
+from extensions import db
+from models import NotificationOutbox, Payment, SeatHold, Ticket
+from notifications import drain_outbox, get_provider
+
+
+def test_initialize_webhook_issues_ticket_and_queues_notifications(app, movie_id, paystack_mock, checkout, send_webhook):
+    reference = checkout(movie_id)
+    assert paystack_mock['transactions'][reference]['amount'] == 1300000
+
+    assert send_webhook('charge.success', reference).status_code == 200
+    assert send_webhook('charge.success', reference).json['message'] == 'Duplicate event'
+
+    with app.app_context():
+        assert webhooks.process_events() == 1
+        payment = Payment.query.filter_by(paystack_ref=reference).one()
+        ticket = Ticket.query.filter_by(payment_id=payment.id).one()
+        assert payment.status == 'success'
+        assert ticket.notified_at is not None
+        queued = {message.channel: message for message in NotificationOutbox.query}
+        assert set(queued) == {'email', 'whatsapp'}
+        assert ticket.token in queued['email'].body
+
+        assert drain_outbox() == 2
+        sent = {message['channel']: message for message in get_provider().sent}
+        assert sent['email']['recipient'] == 'admin@example.com'
+        assert ticket.token in sent['whatsapp']['body']
+
+
+def test_reconcile_fails_abandoned_checkout(app, movie_id, paystack_mock, checkout):
+    reference = checkout(movie_id, ticket_type='vip')
+    requests.post(f"{os.environ['PAYSTACK_BASE_URL']}/_mock/transactions/{reference}", json={'status': 'abandoned'})
+
+    with app.app_context():
+        # Old enough for the reconciler to pick up.
+        Payment.query.update({'created_at': datetime.utcnow() - reconcile.STALE_AFTER - timedelta(minutes=1)})
+        db.session.commit()
+        assert reconcile.reconcile_payments() == {'failed': 1}
+        assert Payment.query.filter_by(paystack_ref=reference).one().status == 'failed'
+        assert Ticket.query.count() == 0
+        assert SeatHold.query.count() == 0  # the VIP seat goes back on sale
@@ -0,0 +1,44 @@
+import pytest
+
+import webhooks
+from extensions import db
+from models import BulkJob, BulkJobRecipient, MovieInventory, NotificationOutbox, Payment, Ticket
+
+
+@pytest.mark.parametrize('ticket_type', ['regular', 'vip'])
+def test_every_confirmation_path_issues_one_ticket(app, client, admin_headers, movie_id, paystack_mock,
+                                                    checkout, send_webhook, ticket_type):
+    reference = checkout(movie_id, ticket_type)
+
+    # Browser redirect, then Paystack's webhook, then the frontend's verify call.
+    assert client.get(f'/api/payment-callback?reference={reference}').status_code == 302
+    assert send_webhook('charge.success', reference).status_code == 200
+    with app.app_context():
+        webhooks.process_events()
+    assert client.get(f'/api/payments/verify/{reference}', headers=admin_headers).status_code == 200
+
+    with app.app_context():
+        payment = Payment.query.filter_by(paystack_ref=reference).one()
+        assert payment.status == 'success'
+        assert Ticket.query.filter_by(payment_id=payment.id).count() == 1
+        channels = sorted(message.channel for message in NotificationOutbox.query)
+        assert channels == ['email', 'whatsapp']
+        if ticket_type == 'vip':
+            assert db.session.get(MovieInventory, movie_id).vip_sold == 1
+
+
+@pytest.mark.parametrize('method', ['email', 'whatsapp'])
+def test_send_vip_ticket_queues_a_bulk_job(app, client, admin_headers, movie_id, method):
+    response = client.post('/api/admin/send-vip-ticket', headers=admin_headers, json={
+        'movie_id': movie_id, 'recipient': 'admin@example.com', 'phone': '+2348000000000', 'method': method})
+    assert response.status_code == 202
+    [issued] = response.json['tickets']
+
+    with app.app_context():
+        job = db.session.get(BulkJob, response.json['job_id'])
+        assert job.kind == 'vip_ticket'
+        assert job.status == 'queued'
+        [recipient] = BulkJobRecipient.query.filter_by(job_id=job.id).all()
+        assert recipient.channel == method
+        assert recipient.ticket_token == issued['ticket_token']
+        assert bool(job.email_template) == (method == 'email')
@@ -0,0 +1,102 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+import routes
+from tokens import ALPHABET, CHECK_SYMBOLS, PAYLOAD_CHARS, encode_token, validate_token
+
+
+def test_encoded_tokens_validate():
+    for number in (0, 1, 2, 12345, (1 << 30) - 1):
+        token = encode_token(number)
+        assert validate_token(token) == token
+
+
+def test_validate_normalises_crockford_aliases():
+    token = encode_token(7)
+    typed = token.lower().replace('0', 'o').replace('1', 'l')
+    assert validate_token(f' {typed[:3]}-{typed[3:]} ') == token
+
+
+def test_validate_rejects_single_substitution():
+    for token in (encode_token(42), encode_token(4242)):
+        for position in range(len(token)):
+            for char in CHECK_SYMBOLS if position == PAYLOAD_CHARS else ALPHABET:
+                if char != token[position]:
+                    typo = token[:position] + char + token[position + 1:]
+                    assert validate_token(typo) is None, typo
+
+
+def test_validate_rejects_adjacent_transposition():
+    token = encode_token(99)
+    for position in range(len(token) - 2):
+        swapped = token[:position] + token[position + 1] + token[position] + token[position + 2:]
+        if swapped != token:
+            assert validate_token(swapped) is None
+
+
+def test_validate_rejects_malformed():
+    assert validate_token('ABC') is None
+    assert validate_token('ABCUEF0') is None
+    assert validate_token(None) is None
+    assert validate_token(1234567) is None
+
+
+@pytest.fixture
+def ticket_queries(app):
+    """SQL statements touching the tickets table while the test runs."""
+    from extensions import db
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if 'tickets' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_verify_token_rejects_typo_without_lookup(client, admin_headers, ticket_queries, monkeypatch):
+    monkeypatch.setattr(routes, 'ACCEPT_LEGACY_TOKENS', False)
+    token = encode_token(5)
+    typo = token[:-1] + CHECK_SYMBOLS[(CHECK_SYMBOLS.index(token[-1]) + 1) % len(CHECK_SYMBOLS)]
+    response = client.post('/api/admin/verify-token', headers=admin_headers, json={'token': typo})
+    assert response.status_code == 400
+    assert ticket_queries == []
+
+
+def _add_ticket(app, token):
+    from extensions import db
+    from models import Movie, Ticket, User, UNUSABLE_PASSWORD
+    with app.app_context():
+        movie = Movie(title='Premiere', premiere_date=date(2025, 11, 22), price=13000)
+        guest = User(email='guest@example.com', phone='+2348000000001', password_hash=UNUSABLE_PASSWORD)
+        db.session.add_all([movie, guest])
+        db.session.flush()
+        db.session.add(Ticket(user_id=guest.id, movie_id=movie.id, token=token, ticket_type='vip'))
+        db.session.commit()
+
+
+def test_verify_token_finds_ticket(app, client, admin_headers):
+    token = encode_token(6)
+    _add_ticket(app, token)
+    response = client.post('/api/admin/verify-token', headers=admin_headers, json={'token': token.lower()})
+    assert response.status_code == 200
+    assert response.json['user_email'] == 'guest@example.com'
+    assert response.json['ticket_type'] == 'vip'
+
+    missing = client.post('/api/admin/verify-token', headers=admin_headers, json={'token': encode_token(8)})
+    assert missing.status_code == 404
+
+
+def test_verify_token_accepts_legacy_token_by_default(app, client, admin_headers):
+    legacy = 'QWERTY7'
+    assert validate_token(legacy) is None
+    _add_ticket(app, legacy)
+    response = client.post('/api/admin/verify-token', headers=admin_headers, json={'token': legacy})
+    assert response.status_code == 200
+    assert response.json['user_email'] == 'guest@example.com'
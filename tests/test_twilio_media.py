@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import threading
+
+from sqlalchemy import insert
+
+import twilio_media
+from extensions import db
+from models import TwilioMedia
+
+FLIER = SimpleNamespace(sha256='f' * 64)
+
+
+def test_concurrent_callers_upload_once(app, client, monkeypatch):
+    uploads = []
+    started = threading.Event()
+
+    def upload(flier, twilio_client):
+        uploads.append(flier.sha256)
+        started.wait(1)
+        return 'https://content.twilio.com/v1/Content/HX1'
+
+    monkeypatch.setattr(twilio_media, 'upload_image_to_twilio', upload)
+    monkeypatch.setattr(twilio_media, '_local_cache', type(twilio_media._local_cache)())
+
+    def fetch():
+        with app.app_context():
+            return twilio_media.get_twilio_media_url(FLIER, None)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(fetch) for _ in range(4)]
+        started.set()
+        urls = {future.result() for future in futures}
+
+    assert urls == {'https://content.twilio.com/v1/Content/HX1'}
+    assert uploads == [FLIER.sha256]
+
+
+def test_waits_for_upload_claimed_by_another_process(app, client, monkeypatch):
+    monkeypatch.setattr(twilio_media, 'upload_image_to_twilio', lambda flier, twilio_client: 'unexpected upload')
+    monkeypatch.setattr(twilio_media, '_local_cache', type(twilio_media._local_cache)())
+    monkeypatch.setattr(twilio_media, 'CLAIM_POLL_SECONDS', 0.01)
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(insert(TwilioMedia).values(sha256=FLIER.sha256, media_url=twilio_media.UPLOADING,
+                                                    expires_at=datetime.utcnow() + twilio_media.UPLOAD_LEASE))
+
+        def finish_upload():
+            with app.app_context(), db.engine.begin() as conn:
+                conn.execute(TwilioMedia.__table__.update().values(
+                    media_url='https://content.twilio.com/v1/Content/HX2',
+                    expires_at=datetime.utcnow() + timedelta(hours=1)))
+
+        timer = threading.Timer(0.1, finish_upload)
+        timer.start()
+        assert twilio_media.get_twilio_media_url(FLIER, None) == 'https://content.twilio.com/v1/Content/HX2'
+        timer.join()
@@ -0,0 +1,148 @@
+from extensions import db
+from models import Ticket, Payment, Movie, User, UNUSABLE_PASSWORD
+from inventory import confirm_payment, allocate_vip
+from messages import queue_ticket_notifications
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+import secrets
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sequence-derived tokens cannot collide with each other, but legacy random
+# tokens share the same code space, so a conflict is retried with a fresh one.
+TOKEN_ATTEMPTS = 3
+
+
+def create_ticket(token=None, **fields):
+    """Add a ticket under a savepoint, drawing a new token if the given one is taken."""
+    for attempt in range(TOKEN_ATTEMPTS):
+        ticket = Ticket(token=token or Ticket.generate_token(), **fields)
+        try:
+            with db.session.begin_nested():
+                db.session.add(ticket)
+            return ticket
+        except IntegrityError:
+            # A conflict on payment_id means the payment already has its ticket; a new token won't help.
+            payment_id = fields.get('payment_id')
+            if attempt == TOKEN_ATTEMPTS - 1 or (payment_id and Ticket.query.filter_by(payment_id=payment_id).first()):
+                raise
+            logger.warning('Ticket token %s already taken, retrying', ticket.token)
+            token = None
+
+
+def create_tickets(rows):
+    """Add one ticket per dict of fields, with all tokens from a single sequence round trip."""
+    for attempt in range(TOKEN_ATTEMPTS):
+        tokens = Ticket.generate_tokens(len(rows))
+        tickets = [Ticket(token=token, **fields) for token, fields in zip(tokens, rows)]
+        try:
+            with db.session.begin_nested():
+                db.session.add_all(tickets)
+            return tickets
+        except IntegrityError:
+            if attempt == TOKEN_ATTEMPTS - 1:
+                raise
+            logger.warning('Ticket token conflict in batch, retrying with fresh tokens')
+
+
+def issue_ticket(payment_id):
+    """Mark a verified payment paid and issue its ticket, exactly once.
+
+    The payment row is locked, so when the redirect, webhook and verify call
+    confirm the same payment concurrently, the first one issues the ticket and
+    queues its notifications and the others get that ticket back. The unique
+    tickets.payment_id backs this up where row locks are unavailable. The
+    caller commits. Returns (ticket, created).
+    """
+    payment = Payment.query.filter_by(id=payment_id).with_for_update().populate_existing().one()
+    if payment.status == 'success':
+        return Ticket.query.filter_by(payment_id=payment.id).first(), False
+    movie = db.session.get(Movie, payment.movie_id)
+    user = db.session.get(User, payment.user_id)
+    if not movie or not user:
+        raise LookupError(f'Missing movie ({payment.movie_id}) or user ({payment.user_id})')
+    try:
+        ticket = create_ticket(user_id=payment.user_id, movie_id=payment.movie_id,
+                               payment_id=payment.id, ticket_type=payment.ticket_type)
+    except IntegrityError:
+        ticket = Ticket.query.filter_by(payment_id=payment.id).first()
+        if ticket is None:
+            raise
+        logger.info('Payment %s was confirmed concurrently, reusing ticket %s', payment.id, ticket.token)
+        return ticket, False
+    payment.status = 'success'
+    confirm_payment(payment)
+    queue_ticket_notifications(user, movie, payment.ticket_type, ticket.token)
+    ticket.notified_at = datetime.utcnow()
+    logger.info('Ticket %s issued for payment %s', ticket.token, payment.paystack_ref)
+    return ticket, True
+
+
+def _insert_ignoring_conflicts(model, rows):
+    """INSERT ... ON CONFLICT DO NOTHING; rows that hit any unique constraint are skipped."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        db.session.execute(postgresql.insert(model).values(rows).on_conflict_do_nothing())
+    elif dialect == 'sqlite':
+        db.session.execute(sqlite.insert(model).values(rows).on_conflict_do_nothing())
+    else:
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(model(**row))
+            except IntegrityError:
+                pass
+
+
+def resolve_guests(guests, match_on='email'):
+    """Find or create a user for each (email, phone) guest, matching on email or phone.
+
+    Existing users are loaded with one query and missing ones created with one
+    INSERT ... ON CONFLICT DO NOTHING. Guests matched by phone get a placeholder
+    email. New accounts have no usable password. Returns {match key: User}; a
+    guest missing from it could not be created, e.g. because the other field
+    belongs to another account.
+    """
+    keys = {email if match_on == 'email' else phone for email, phone in guests}
+    column = User.email if match_on == 'email' else User.phone
+    users = {getattr(user, match_on): user for user in User.query.filter(column.in_(keys))}
+    new_rows = {}
+    for email, phone in guests:
+        key = email if match_on == 'email' else phone
+        if key not in users and key not in new_rows:
+            new_rows[key] = {'email': email if match_on == 'email' else f'vip_{secrets.token_hex(8)}@example.com',
+                             'phone': phone, 'password_hash': UNUSABLE_PASSWORD}
+    if new_rows:
+        _insert_ignoring_conflicts(User, list(new_rows.values()))
+        users.update({getattr(user, match_on): user for user in User.query.filter(column.in_(list(new_rows)))})
+        logger.info('Created %s guest account(s)', sum(1 for key in new_rows if key in users))
+    return users
+
+
+def issue_vip_tickets(movie_id, guests, match_on='email'):
+    """Issue one VIP ticket per (email, phone) guest in a single batch; the caller commits.
+
+    Users are resolved in bulk, seats are allocated once for the whole list
+    (SoldOut if they don't fit) and tickets are inserted together. Returns
+    {'issued': [...], 'failed': [...]}; a failed guest gets no seat or ticket.
+    """
+    users = resolve_guests(guests, match_on)
+    issued, failed = [], []
+    for email, phone in guests:
+        user = users.get(email if match_on == 'email' else phone)
+        if user is None:
+            other = 'phone' if match_on == 'email' else 'email'
+            failed.append({'email': email, 'phone': phone,
+                           'error': f'Could not create a user: {other} belongs to another account'})
+        else:
+            issued.append({'email': email, 'phone': phone, 'user_id': user.id})
+    if issued:
+        allocate_vip(movie_id, len(issued))
+        tickets = create_tickets([{'user_id': guest['user_id'], 'movie_id': movie_id, 'ticket_type': 'vip'}
+                                  for guest in issued])
+        for guest, ticket in zip(issued, tickets):
+            guest['ticket_token'] = ticket.token
+    logger.info('Issued %s VIP ticket(s) for movie %s, %s failed', len(issued), movie_id, len(failed))
+    return {'issued': issued, 'failed': failed}
@@ -0,0 +1,73 @@
+import hashlib
+import hmac
+import os
+
+# Crockford base32: no I, L, O or U, so codes read back cleanly at the door.
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+# Crockford's check symbols: the payload value mod 37, a prime, so any single
+# substitution or adjacent transposition changes the check symbol.
+CHECK_SYMBOLS = ALPHABET + '*~$=U'
+PAYLOAD_CHARS = 6
+PAYLOAD_BITS = 5 * PAYLOAD_CHARS
+HALF_BITS = PAYLOAD_BITS // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+# Tickets issued before check-digit codes have random 7-character tokens, so codes are
+# also looked up as typed. Set LEGACY_TICKET_TOKENS=false once none of those are in use
+# to reject codes with a bad check digit without a lookup.
+ACCEPT_LEGACY_TOKENS = os.getenv('LEGACY_TICKET_TOKENS', 'true').lower() != 'false'
+# Crockford decoding reads the look-alike letters as the digits they resemble.
+ALIASES = str.maketrans({'O': '0', 'I': '1', 'L': '1'})
+
+
+def _secret():
+    return (os.getenv('TICKET_TOKEN_SECRET') or os.getenv('JWT_SECRET_KEY') or 'ohams-movies').encode()
+
+
+def _round(value, round_index):
+    digest = hmac.new(_secret(), f'{round_index}:{value}'.encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], 'big') & HALF_MASK
+
+
+def permute(value):
+    """Keyed Feistel permutation of a 30-bit integer.
+
+    Being a bijection, distinct sequence numbers always map to distinct
+    codes, while consecutive numbers do not produce guessable codes.
+    """
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_index in range(ROUNDS):
+        left, right = right, left ^ _round(right, round_index)
+    return (left << HALF_BITS) | right
+
+
+def _check_symbol(value):
+    return CHECK_SYMBOLS[value % len(CHECK_SYMBOLS)]
+
+
+def encode_token(number):
+    """Encode a sequence number as a 7-char code: six base32 digits plus a check symbol."""
+    value = permute(number & ((1 << PAYLOAD_BITS) - 1))
+    digits = [(value >> (5 * i)) & 31 for i in reversed(range(PAYLOAD_CHARS))]
+    return ''.join(ALPHABET[d] for d in digits) + _check_symbol(value)
+
+
+def validate_token(token):
+    """Normalise a typed code and verify its check symbol.
+
+    Accepts lowercase, hyphens/spaces and the Crockford look-alikes (O for 0,
+    I or L for 1). Returns the canonical code, or None when it is malformed or
+    the check symbol does not match, e.g. one mistyped or two swapped characters.
+    """
+    if not isinstance(token, str):
+        return None
+    code = token.strip().upper().replace('-', '').replace(' ', '').translate(ALIASES)
+    payload, check = code[:PAYLOAD_CHARS], code[PAYLOAD_CHARS:]
+    if len(code) != PAYLOAD_CHARS + 1 or any(char not in ALPHABET for char in payload) or check not in CHECK_SYMBOLS:
+        return None
+    value = 0
+    for char in payload:
+        value = value * 32 + ALPHABET.index(char)
+    if _check_symbol(value) != check:
+        return None
+    return code
@@ -0,0 +1,156 @@
+from extensions import db
+from models import TwilioMedia
+from metrics import track_call
+from sqlalchemy import select, delete, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+import requests
+import time
+import base64
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Uploaded media is reused for this long before the flier is uploaded again.
+MEDIA_TTL = timedelta(hours=int(os.getenv('TWILIO_MEDIA_TTL_HOURS', '24')))
+LOCAL_CACHE_SIZE = 256
+# A worker uploading a flier holds its row this long before others may take over.
+UPLOAD_LEASE = timedelta(seconds=int(os.getenv('TWILIO_MEDIA_UPLOAD_LEASE_SECONDS', '30')))
+CLAIM_POLL_SECONDS = 0.5
+# media_url of the placeholder row that marks an upload in progress.
+UPLOADING = ''
+
+# Per-process front for the shared twilio_media_cache table.
+_local_cache = OrderedDict()
+_local_lock = Lock()
+_upload_locks = {}
+
+
+def upload_image_to_twilio(flier, twilio_client):
+    """Upload a stored flier to Twilio Content API and return media URL."""
+    try:
+        if flier.size > 5 * 1024 * 1024:
+            logger.warning('Image exceeds size limit')
+            return None
+        if flier.content_type not in ['image/jpeg', 'image/png']:
+            logger.warning('Unsupported image format')
+            return None
+        image_data = flier.data
+        url = 'https://content.twilio.com/v1/Content'
+        headers = {
+            'Authorization': f'Basic {base64.b64encode(f"{os.getenv("TWILIO_ACCOUNT_SID")}:{os.getenv("TWILIO_AUTH_TOKEN")}".encode()).decode()}',
+            'Content-Type': 'application/json'
+        }
+        payload = {
+            'ContentType': flier.content_type,
+            'FriendlyName': 'Movie Flier',
+            'Content': base64.b64encode(image_data).decode('utf-8')
+        }
+        with track_call('twilio', 'content_upload'):
+            response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response_data = response.json()
+        if response.status_code == 201:
+            content_sid = response_data['sid']
+            logger.info('Image uploaded to Twilio, Content SID: %s', content_sid)
+            return f"https://content.twilio.com/v1/Content/{content_sid}"
+        else:
+            logger.warning('Failed to upload image to Twilio: %s', response_data)
+            return None
+    except Exception as e:
+        logger.exception('Error uploading image to Twilio: %s', e)
+        return None
+
+def _remember(sha256, media_url, expires_at):
+    with _local_lock:
+        _local_cache[sha256] = (media_url, expires_at)
+        _local_cache.move_to_end(sha256)
+        while len(_local_cache) > LOCAL_CACHE_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def _cached(sha256, now):
+    with _local_lock:
+        cached = _local_cache.get(sha256)
+    return cached[0] if cached and cached[1] > now else None
+
+
+def _hash_lock(sha256):
+    with _local_lock:
+        return _upload_locks.setdefault(sha256, Lock())
+
+
+def _claim_upload(sha256, now):
+    """Insert an in-progress placeholder for sha256; True if this worker now owns the upload.
+
+    Expired rows, including placeholders left by a worker that died mid-upload,
+    are cleared first so their flier can be claimed again.
+    """
+    placeholder = {'sha256': sha256, 'media_url': UPLOADING, 'expires_at': now + UPLOAD_LEASE}
+    with db.engine.begin() as conn:
+        conn.execute(delete(TwilioMedia).where(TwilioMedia.expires_at <= now))
+        dialect = conn.dialect.name
+        if dialect == 'postgresql':
+            result = conn.execute(postgresql.insert(TwilioMedia).values(placeholder).on_conflict_do_nothing())
+        elif dialect == 'sqlite':
+            result = conn.execute(sqlite.insert(TwilioMedia).values(placeholder).on_conflict_do_nothing())
+        else:
+            try:
+                with conn.begin_nested():
+                    result = conn.execute(insert(TwilioMedia).values(placeholder))
+            except IntegrityError:
+                return False
+        return result.rowcount == 1
+
+
+def get_twilio_media_url(flier, twilio_client):
+    """Return a Twilio media URL for a stored flier, uploading it at most once per TTL.
+
+    Entries are keyed by the flier's content hash and kept in the
+    twilio_media_cache table so every worker shares them. The table is written
+    on its own connection so callers' pending session state is not committed.
+    One thread per process handles a given flier; across processes, the worker
+    whose placeholder row lands first uploads while the others poll the row.
+    """
+    if not flier:
+        return None
+    sha256 = flier.sha256
+    media_url = _cached(sha256, datetime.utcnow())
+    if media_url:
+        return media_url
+
+    with _hash_lock(sha256):
+        deadline = time.monotonic() + UPLOAD_LEASE.total_seconds()
+        while True:
+            now = datetime.utcnow()
+            media_url = _cached(sha256, now)
+            if media_url:
+                return media_url
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    select(TwilioMedia.media_url, TwilioMedia.expires_at).where(TwilioMedia.sha256 == sha256)
+                ).first()
+            if row and row.media_url != UPLOADING and row.expires_at > now:
+                _remember(sha256, row.media_url, row.expires_at)
+                return row.media_url
+            if _claim_upload(sha256, now):
+                break
+            if time.monotonic() >= deadline:
+                logger.warning('Timed out waiting for another worker to upload flier %s', sha256)
+                return None
+            time.sleep(CLAIM_POLL_SECONDS)
+
+        media_url = upload_image_to_twilio(flier, twilio_client)
+        with db.engine.begin() as conn:
+            placeholder = (TwilioMedia.sha256 == sha256) & (TwilioMedia.media_url == UPLOADING)
+            if not media_url:
+                # Let the next caller try the upload again.
+                conn.execute(delete(TwilioMedia).where(placeholder))
+                return None
+            expires_at = datetime.utcnow() + MEDIA_TTL
+            conn.execute(update(TwilioMedia).where(placeholder).values(media_url=media_url, expires_at=expires_at))
+        _remember(sha256, media_url, expires_at)
+        return media_url
@@ -0,0 +1,77 @@
+from extensions import db
+from models import PaystackEvent, Payment
+from ticketing import issue_ticket
+from sqlalchemy.exc import IntegrityError
+from retry_queue import claim_batch, record_failure
+from datetime import datetime
+import hashlib
+import hmac
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.getenv('PAYSTACK_EVENT_MAX_ATTEMPTS', '8'))
+BATCH_SIZE = int(os.getenv('PAYSTACK_EVENT_BATCH_SIZE', '20'))
+
+
+def verify_signature(raw_body, signature):
+    """Check Paystack's x-paystack-signature: HMAC-SHA512 of the raw body keyed with the secret key."""
+    secret = os.getenv('PAYSTACK_SECRET_KEY')
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), raw_body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+
+def record_event(event, raw_body):
+    """Store a verified event for the worker; returns False if it was already received.
+
+    Commits, so the webhook can acknowledge as soon as this returns.
+    """
+    data = event.get('data') or {}
+    reference = data.get('reference')
+    dedupe_key = f"{event['event']}:{data.get('id') or reference}"
+    try:
+        with db.session.begin_nested():
+            db.session.add(PaystackEvent(dedupe_key=dedupe_key[:255], event=event['event'], reference=reference,
+                                         payload=raw_body.decode('utf-8')))
+    except IntegrityError:
+        logger.info('Duplicate Paystack event %s ignored', dedupe_key)
+        return False
+    db.session.commit()
+    return True
+
+
+def _handle(event):
+    if event.event != 'charge.success':
+        logger.debug('Unhandled Paystack event: %s', event.event)
+        return 'ignored'
+    payment = Payment.query.filter_by(paystack_ref=event.reference).first()
+    if not payment:
+        # The checkout may not be committed yet; retried with backoff.
+        raise LookupError(f'Payment not found for reference: {event.reference}')
+    issue_ticket(payment.id)
+    return 'processed'
+
+
+def process_events(limit=BATCH_SIZE):
+    """Background task: apply stored webhook events, retrying failures with exponential backoff."""
+    event_ids = [event.id for event in claim_batch(PaystackEvent, limit)]
+    for event_id in event_ids:
+        event = db.session.get(PaystackEvent, event_id)
+        try:
+            event.status = _handle(event)
+            event.processed_at = datetime.utcnow()
+            event.last_error = None
+            db.session.commit()
+            logger.info('Paystack event %s %s', event.dedupe_key, event.status)
+        except Exception as e:
+            db.session.rollback()
+            event = db.session.get(PaystackEvent, event_id)
+            if record_failure(event, e, MAX_ATTEMPTS):
+                logger.warning('Paystack event %s failed permanently: %s', event.dedupe_key, e)
+            else:
+                logger.warning('Paystack event %s attempt %s failed: %s', event.dedupe_key, event.attempts, e)
+            db.session.commit()
+    return len(event_ids)
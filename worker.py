@@ -0,0 +1,101 @@
+from extensions import db
+from threading import Thread, Event, current_thread
+import click
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """Runs registered periodic tasks on a daemon thread inside the app context."""
+
+    def __init__(self, app, poll_interval=1.0):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.tasks = []
+        self._stop = Event()
+        self._thread = None
+
+    def register(self, name, func, interval):
+        self.tasks.append({'name': name, 'func': func, 'interval': interval, 'next_run': 0.0})
+
+    def run_pending(self):
+        now = time.monotonic()
+        for task in self.tasks:
+            if task['next_run'] > now:
+                continue
+            task['next_run'] = now + task['interval']
+            with self.app.app_context():
+                try:
+                    task['func']()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.exception('Background task %s failed: %s', task['name'], e)
+                finally:
+                    db.session.remove()
+
+    def run_forever(self):
+        if self._thread and self._thread is not current_thread():
+            # Started on import with BACKGROUND_WORKER=thread; take the loop over so tasks never run twice.
+            self.stop()
+            self._thread.join()
+            self._stop.clear()
+            self._thread = None
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = Thread(target=self.run_forever, name='background-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def init_worker(app):
+    """Create the app's worker, register tasks, and start it unless disabled.
+
+    In production, set BACKGROUND_WORKER=off on the web service and run one
+    `flask --app app run-worker` process (render.yaml does both). Tasks share
+    that process's loop, so each keeps its own time limit (reconciliation:
+    RECONCILE_TIME_BUDGET_SECONDS). BACKGROUND_WORKER=thread (default) runs the
+    loop inside each web process instead, for local development. Vercel freezes
+    functions between requests, so startup fails there unless
+    BACKGROUND_WORKER=off and the worker runs on a long-lived host.
+    """
+    from notifications import drain_outbox
+    from campaigns import dispatch_bulk_jobs
+    from paystack import precheck_dns
+    from webhooks import process_events
+    from reconcile import reconcile_payments
+
+    worker = BackgroundWorker(app)
+    worker.register('outbox', drain_outbox, interval=float(os.getenv('OUTBOX_POLL_SECONDS', '2')))
+    worker.register('bulk_jobs', dispatch_bulk_jobs, interval=float(os.getenv('BULK_POLL_SECONDS', '2')))
+    worker.register('paystack_events', process_events, interval=float(os.getenv('PAYSTACK_EVENTS_POLL_SECONDS', '1')))
+    worker.register('reconcile_payments', reconcile_payments,
+                    interval=float(os.getenv('RECONCILE_INTERVAL_SECONDS', '300')))
+    worker.register('paystack_dns', precheck_dns, interval=float(os.getenv('PAYSTACK_DNS_CHECK_SECONDS', '60')))
+    app.extensions['background_worker'] = worker
+
+    @app.cli.command('run-worker')
+    def run_worker():
+        """Run background tasks in the foreground until interrupted."""
+        worker.run_forever()
+
+    @app.cli.command('reconcile-payments')
+    def reconcile_once():
+        """Verify one batch of stale pending payments with Paystack and print the outcomes."""
+        click.echo(reconcile_payments())
+
+    if os.getenv('BACKGROUND_WORKER', 'thread') == 'thread':
+        if os.getenv('VERCEL'):
+            raise EnvironmentError('BACKGROUND_WORKER=thread cannot run on Vercel; set BACKGROUND_WORKER=off '
+                                   'and run `flask --app app run-worker` on a long-lived host')
+        worker.start()
+    return worker